@@ -0,0 +1,163 @@
+"""
+Backtest du drapeau météo contre les densités de cyanobactéries toxiques observées
+
+Utilisation (depuis analyse/) :
+    python backtest.py --lakes BHR BRR --workers 4 --output backtest.json
+
+L'historique météo est lu dans weather_store (téléchargé au premier lancement seulement) :
+les lancements suivants fonctionnent hors ligne.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from datasets import read_sheet
+from fusion import load_taxa, stored_conditions
+from presence import RISK_THRESHOLDS, cyano_presence_all
+import weather_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import predictor
+from risk import FLAGS
+
+TAXA_FILE = "./data2/cyanotoxin-taxa-data-xlsx-3.xls"
+RESERVOIR_FILE = "./data2/reservoir-information-xlsx-4.xls"
+
+# Fenêtre météo analysée avant chaque prélèvement (comme fusion.get_weather_data)
+WINDOW_DAYS = weather_store.WINDOW_DAYS
+
+RESERVOIR_TYPES = {'Forest': 'forest', 'For': 'forest', 'Ag': 'agriculture', 'Urban': 'urban'}
+
+def load_reservoirs(file_path=RESERVOIR_FILE):
+    """
+    Coordonnées et type de chaque réservoir : {code: {'latitude', 'longitude', 'type'}}
+    """
+    df = read_sheet(file_path, 'Reservoir_information').iloc[1:]  # ligne 1 : unités
+    return {
+        row['Reservoir abbreviation']: {
+            'latitude': float(row['Latitude']),
+            'longitude': float(row['Longitude']),
+            'type': RESERVOIR_TYPES[row['Type']]
+        }
+        for _, row in df.iterrows()
+    }
+
+def load_samples(lakes=None, taxa_file=TAXA_FILE, reservoir_file=RESERVOIR_FILE,
+                 store_dir=weather_store.STORE_DIR, window_days=WINDOW_DAYS):
+    """
+    Prélèvements de chaque réservoir avec leur drapeau observé, après téléchargement des années
+    d'historique météo absentes du stockage local (les autres ne sont pas redemandées)
+    Retourne (lakes, reservoirs, {lac: prélèvements}, timings)
+    """
+    started = time.perf_counter()
+    taxa = load_taxa(taxa_file)
+    reservoirs = load_reservoirs(reservoir_file)
+    loaded = time.perf_counter()
+
+    lakes = lakes or [lake for lake in reservoirs if lake in set(taxa['reservoir'])]
+    # Drapeaux observés de tous les réservoirs en une seule agrégation
+    presence = cyano_presence_all(taxa, RISK_THRESHOLDS)
+    samples = {lake: group for lake, group in presence.groupby('reservoir', observed=True)}
+
+    downloaded = weather_store.ingest({
+        lake: {**reservoirs[lake], 'years': weather_store.sample_years(samples[lake]['date'], window_days)}
+        for lake in lakes
+    }, store_dir)
+    return lakes, reservoirs, samples, {
+        'load_seconds': round(loaded - started, 3),
+        'ingest_seconds': round(time.perf_counter() - loaded, 3),
+        'downloaded_partitions': downloaded
+    }
+
+def backtest_lake(task):
+    """
+    Backtest d'un réservoir (exécuté dans un processus du pool)
+    Conditions de toutes les fenêtres en un seul passage sur l'historique local, notées comme dans l'application
+    """
+    lake, reservoir, samples, store_dir = task
+    started = time.perf_counter()
+
+    # Fenêtres incomplètes dans l'historique local ignorées (comme dans calibrate.py) : leurs moyennes
+    # manquantes donneraient VERT et fausseraient la matrice de confusion
+    conditions = stored_conditions(lake, samples['date'], WINDOW_DAYS, store_dir)
+    dates = pd.to_datetime(samples['date']).dt.strftime("%Y-%m-%d")
+    scored = dates.isin(conditions).to_numpy()
+    predictions = predictor.score_days({date: conditions[date] for date in dates[scored]}, reservoir['type'])
+
+    return {
+        'lake': lake,
+        'observed': list(samples['risk_level'][scored]),
+        'predicted': [prediction['flag'] for prediction in predictions],
+        'skipped': int((~scored).sum()),
+        'score_seconds': round(time.perf_counter() - started, 3)
+    }
+
+def confusion_report(observed, predicted):
+    """
+    Matrice de confusion {observé: {prédit: n}} et précision/rappel par drapeau
+    """
+    flags = [str(flag) for flag in FLAGS]
+    matrix = {obs: {pred: 0 for pred in flags} for obs in flags}
+    for obs, pred in zip(observed, predicted):
+        matrix[obs][pred] += 1
+
+    scores = {}
+    for flag in flags:
+        true_positives = matrix[flag][flag]
+        predicted_count = sum(matrix[obs][flag] for obs in flags)
+        observed_count = sum(matrix[flag].values())
+        scores[flag] = {
+            'precision': round(true_positives / predicted_count, 4) if predicted_count else None,
+            'recall': round(true_positives / observed_count, 4) if observed_count else None,
+            'support': observed_count
+        }
+    return {'confusion_matrix': matrix, 'scores': scores}
+
+def run_backtest(lakes=None, workers=4, taxa_file=TAXA_FILE, reservoir_file=RESERVOIR_FILE,
+                 store_dir=weather_store.STORE_DIR):
+    started = time.perf_counter()
+    lakes, reservoirs, samples, timings = load_samples(lakes, taxa_file, reservoir_file, store_dir)
+    tasks = [(lake, reservoirs[lake], samples[lake], store_dir) for lake in lakes]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(backtest_lake, tasks))
+
+    observed = [flag for result in results for flag in result['observed']]
+    predicted = [flag for result in results for flag in result['predicted']]
+    return {
+        **confusion_report(observed, predicted),
+        # Prélèvements sans fenêtre météo complète dans l'historique local
+        'skipped_samples': sum(result['skipped'] for result in results),
+        'lakes': {
+            result['lake']: {
+                **confusion_report(result['observed'], result['predicted']),
+                'samples': len(result['observed']),
+                'skipped_samples': result['skipped'],
+                'score_seconds': result['score_seconds']
+            }
+            for result in results
+        },
+        'timings': {
+            **timings,
+            'total_seconds': round(time.perf_counter() - started, 3)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest du drapeau météo sur les données de cyanotoxines")
+    parser.add_argument("--lakes", nargs="*", help="codes des réservoirs (défaut : tous)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    report = json.dumps(run_backtest(args.lakes, args.workers), indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,218 @@
+"""
+Calibration des seuils du drapeau météo contre les drapeaux observés (densités de cyanotoxines)
+
+Les conditions de chaque prélèvement (score de variation météo compris, comme dans l'application)
+sont calculées une seule fois (historique local de weather_store), puis toutes les combinaisons de seuils de GRID sont évaluées par score_risk en un calcul diffusé
+(configurations × prélèvements), par lots de BATCH_SIZE configurations.
+
+Utilisation (depuis analyse/) :
+    python calibrate.py --top 10 --output calibration.json
+    python calibrate.py --lakes BHR BRR --min-precision 0.2
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest import RESERVOIR_FILE, TAXA_FILE, WINDOW_DAYS, load_samples
+from fusion import stored_conditions
+import weather_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from risk import DEFAULT_THRESHOLDS, FLAGS, LAKE_TYPES, score_risk
+
+# Valeurs essayées pour chaque paramètre (les seuils actuels en font partie)
+GRID = {
+    'temp_shift': [-3, -2, -1, 0, 1, 2, 3],   # décalage des seuils de température de tous les types de lac
+    'temp_gap': [1, 2, 3],                    # écart entre seuil "base" et seuil "high"
+    'humidity': [55, 60, 65, 70, 75],
+    'humidity_gap': [5, 10],
+    'wind': [6, 8, 10, 12],
+    'wind_gap': [3],
+    'soil_temp': [22, 24, 26],
+    'soil_gap': [2],
+    'low_cut': [0.5, 1.5, 2.5],
+    'cut_gap': [0, 1, 2]
+}
+BATCH_SIZE = 2048
+
+def default_params():
+    """
+    Paramètres de GRID correspondant à DEFAULT_THRESHOLDS
+    """
+    temp = DEFAULT_THRESHOLDS['temp']['forest']
+    return {
+        'temp_shift': 0,
+        'temp_gap': temp[1] - temp[0],
+        'humidity': DEFAULT_THRESHOLDS['humidity'][0],
+        'humidity_gap': DEFAULT_THRESHOLDS['humidity'][1] - DEFAULT_THRESHOLDS['humidity'][0],
+        'wind': DEFAULT_THRESHOLDS['wind'][0],
+        'wind_gap': DEFAULT_THRESHOLDS['wind'][0] - DEFAULT_THRESHOLDS['wind'][1],
+        'soil_temp': DEFAULT_THRESHOLDS['soil_temp'][0],
+        'soil_gap': DEFAULT_THRESHOLDS['soil_temp'][1] - DEFAULT_THRESHOLDS['soil_temp'][0],
+        'low_cut': DEFAULT_THRESHOLDS['cuts'][0],
+        'cut_gap': DEFAULT_THRESHOLDS['cuts'][1] - DEFAULT_THRESHOLDS['cuts'][0]
+    }
+
+def parameter_grid(grid=GRID):
+    """
+    Toutes les combinaisons de grid : {paramètre: tableau de C valeurs}
+    """
+    values = np.array(list(itertools.product(*grid.values())), dtype=float)
+    return {name: values[:, i] for i, name in enumerate(grid)}
+
+def thresholds_for(params):
+    """
+    Seuils au format DEFAULT_THRESHOLDS ; avec des tableaux de C valeurs, chaque seuil est un tableau C × 1
+    diffusé par score_risk contre les N prélèvements
+    """
+    p = {name: np.asarray(value, dtype=float)[..., np.newaxis] for name, value in params.items()}
+    temp = {}
+    for lake_type in LAKE_TYPES:
+        base = DEFAULT_THRESHOLDS['temp'][lake_type][0] + p['temp_shift']
+        temp[lake_type] = (base, base + p['temp_gap'])
+    return {
+        'temp': temp,
+        'humidity': (p['humidity'], p['humidity'] + p['humidity_gap']),
+        'wind': (p['wind'], p['wind'] - p['wind_gap']),
+        'soil_temp': (p['soil_temp'], p['soil_temp'] + p['soil_gap']),
+        'cuts': (p['low_cut'], p['low_cut'] + p['cut_gap'])
+    }
+
+def readable_thresholds(params):
+    """
+    Seuils d'une configuration, à recopier dans DEFAULT_THRESHOLDS
+    """
+    thresholds = thresholds_for({name: [value] for name, value in params.items()})
+
+    def scalar(pair):
+        return tuple(round(float(np.ravel(value)[0]), 2) for value in pair)
+
+    return {
+        name: {lake_type: scalar(pair) for lake_type, pair in value.items()} if name == 'temp' else scalar(value)
+        for name, value in thresholds.items()
+    }
+
+def load_features(lakes=None, taxa_file=TAXA_FILE, reservoir_file=RESERVOIR_FILE,
+                  store_dir=weather_store.STORE_DIR, window_days=WINDOW_DAYS):
+    """
+    Conditions de la fenêtre précédant chaque prélèvement, type de lac et drapeau observé :
+    {'lake', 'date', 'temp', 'humidity', 'wind', 'soil_temp', 'weather_score', 'lake_type', 'observed'}
+    (tableaux de N valeurs)
+    Les prélèvements dont la fenêtre n'est pas entièrement dans l'historique local sont ignorés
+    """
+    lakes, reservoirs, samples, _ = load_samples(lakes, taxa_file, reservoir_file, store_dir, window_days)
+
+    flag_codes = {str(flag): code for code, flag in enumerate(FLAGS)}
+    rows = []
+    for lake in lakes:
+        observed = dict(zip(samples[lake]['date'].dt.strftime('%Y-%m-%d'), samples[lake]['risk_level']))
+        conditions = stored_conditions(lake, samples[lake]['date'], window_days, store_dir)
+        lake_type = LAKE_TYPES.index(reservoirs[lake]['type'])
+        # soil_temp nulle : manquante, comme dans predictor.score_days
+        rows += [(lake, date, values['temp'], values['humidity'], values['wind'], values['soil_temp'] or np.nan,
+                  values['weather_score'], lake_type, flag_codes[observed[date]])
+                 for date, values in conditions.items()]
+
+    frame = pd.DataFrame(rows, columns=['lake', 'date', 'temp', 'humidity', 'wind', 'soil_temp',
+                                        'weather_score', 'lake_type', 'observed'])
+    return {column: frame[column].to_numpy() for column in frame.columns}
+
+def sweep(features, params, batch_size=BATCH_SIZE):
+    """
+    Rappel et précision ROUGE, exactitude de chaque configuration : {nom: tableau de C valeurs}
+    """
+    observed = features['observed']
+    rouge = observed == 2
+    configurations = len(next(iter(params.values())))
+    recall = np.empty(configurations)
+    precision = np.empty(configurations)
+    accuracy = np.empty(configurations)
+
+    for start in range(0, configurations, batch_size):
+        batch = slice(start, start + batch_size)
+        codes = score_risk(features['temp'], features['humidity'], features['wind'], features['soil_temp'],
+                           features['weather_score'], features['lake_type'],
+                           thresholds_for({name: values[batch] for name, values in params.items()}))
+        predicted_rouge = codes == 2
+        true_positives = predicted_rouge[:, rouge].sum(axis=1)
+        predicted_count = predicted_rouge.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            recall[batch] = true_positives / rouge.sum()
+            precision[batch] = np.where(predicted_count > 0, true_positives / predicted_count, np.nan)
+        accuracy[batch] = (codes == observed).mean(axis=1)
+
+    return {'recall_rouge': recall, 'precision_rouge': precision, 'accuracy': accuracy}
+
+def calibrate(lakes=None, grid=GRID, top=10, min_precision=None, store_dir=weather_store.STORE_DIR):
+    """
+    Meilleures configurations par rappel ROUGE (puis précision ROUGE, puis exactitude)
+    min_precision : précision ROUGE minimale (par défaut celle des seuils actuels), pour écarter
+    les configurations qui signalent ROUGE partout
+    """
+    started = time.perf_counter()
+    features = load_features(lakes, store_dir=store_dir)
+    loaded = time.perf_counter()
+
+    params = parameter_grid(grid)
+    scores = sweep(features, params)
+    swept = time.perf_counter()
+
+    baseline_params = default_params()
+    baseline = {name: float(values[0]) for name, values in
+                sweep(features, {name: np.array([value]) for name, value in baseline_params.items()}).items()}
+    if min_precision is None:
+        min_precision = 0.0 if np.isnan(baseline['precision_rouge']) else baseline['precision_rouge']
+
+    eligible = np.flatnonzero(np.nan_to_num(scores['precision_rouge'], nan=-1) >= min_precision)
+    order = eligible[np.lexsort((
+        -scores['accuracy'][eligible],
+        -np.nan_to_num(scores['precision_rouge'][eligible], nan=-1),
+        -scores['recall_rouge'][eligible]
+    ))]
+
+    def entry(params_row, scores_row):
+        return {
+            'params': params_row,
+            'thresholds': readable_thresholds(params_row),
+            **{name: None if np.isnan(value) else round(value, 4) for name, value in scores_row.items()}
+        }
+
+    observed = features['observed']
+    return {
+        'samples': len(observed),
+        'support': {str(flag): int((observed == code).sum()) for code, flag in enumerate(FLAGS)},
+        'configurations': len(scores['accuracy']),
+        'min_precision_rouge': round(min_precision, 4),
+        'baseline': entry(baseline_params, baseline),
+        'best': [
+            entry({name: float(values[i]) for name, values in params.items()},
+                  {name: float(values[i]) for name, values in scores.items()})
+            for i in order[:top]
+        ],
+        'timings': {
+            'features_seconds': round(loaded - started, 3),
+            'sweep_seconds': round(swept - loaded, 3)
+        }
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibration des seuils du drapeau météo")
+    parser.add_argument("--lakes", nargs="*", help="codes des réservoirs (défaut : tous)")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--min-precision", type=float, help="précision ROUGE minimale (défaut : seuils actuels)")
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut : sortie standard)")
+    args = parser.parse_args()
+
+    report = json.dumps(calibrate(args.lakes, top=args.top, min_precision=args.min_precision),
+                        indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
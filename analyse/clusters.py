@@ -0,0 +1,143 @@
+"""
+Regroupement des réservoirs selon leur profil de toxicité
+
+Chaque réservoir est décrit par :
+    densité toxique saisonnière     moyenne de log10(1 + densité toxique) par mois prélevé (mai à octobre)
+    fréquence de dépassement        part des prélèvements au-delà des seuils ORANGE et ROUGE
+    réponse à la température        pente de log10(1 + densité toxique) en fonction de la température
+                                    de surface (ST) du même mois, et température de surface moyenne
+Les caractéristiques sont calculées par agrégations groupées sur tous les réservoirs à la fois,
+puis regroupées par MiniBatchKMeans (adapté à des milliers de lacs).
+
+Les affectations sont écrites dans cache/lake_clusters.json, relu par app/priors.py au moment de la
+prédiction (aucun recalcul côté application).
+
+Utilisation (depuis analyse/) :
+    python clusters.py --clusters 4
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from backtest import RESERVOIR_FILE, TAXA_FILE, load_reservoirs
+from datasets import read_merged
+from fusion import load_taxa
+from presence import RISK_THRESHOLDS, cyano_presence_all
+
+CLUSTERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'lake_clusters.json')
+SEASON = [5, 6, 7, 8, 9, 10]
+MONTH_NAMES = {5: 'May', 6: 'Jun', 7: 'Jul', 8: 'Aug', 9: 'Sep', 10: 'Oct'}
+N_CLUSTERS = 4
+
+def lake_features(taxa, water, thresholds=RISK_THRESHOLDS):
+    """
+    Une ligne de caractéristiques par réservoir (index : code du réservoir)
+    taxa : feuille All_data de cyanotoxin-taxa-data, water : read_merged() (format long)
+    """
+    presence = cyano_presence_all(taxa, thresholds)
+    presence['log_toxic'] = np.log10(1 + presence['toxic_density'])
+    presence['month'] = presence['date'].dt.month
+    presence['year'] = presence['date'].dt.year
+
+    # Densité toxique saisonnière (mois prélevés dans au moins un réservoir) ;
+    # un mois sans prélèvement prend la moyenne du réservoir
+    seasonal = (presence[presence['month'].isin(SEASON)]
+                .pivot_table(index='reservoir', columns='month', values='log_toxic', aggfunc='mean', observed=True))
+    seasonal = seasonal.T.fillna(presence.groupby('reservoir', observed=True)['log_toxic'].mean()).T
+    seasonal.columns = [f"toxic_{MONTH_NAMES[month]}" for month in seasonal.columns]
+
+    exceedance = pd.DataFrame({
+        'orange_rate': presence['risk_level'] != "VERT",
+        'rouge_rate': presence['risk_level'] == "ROUGE",
+        'reservoir': presence['reservoir']
+    }).groupby('reservoir', observed=True).mean()
+
+    # Pente par moindres carrés de la densité toxique mensuelle en fonction de la température de surface
+    surface = pd.DataFrame({
+        'reservoir': water['reservoir'].astype(str),
+        'year': water['year'].astype(int),
+        'month': water['month'].cat.codes + 1,
+        'surface_temp': water['value'].astype(float)
+    })[(water['type'] == 'ST').to_numpy()]
+    monthly = (presence.assign(reservoir=presence['reservoir'].astype(str))
+               .groupby(['reservoir', 'year', 'month'])['log_toxic'].mean().reset_index())
+    joined = monthly.merge(surface, on=['reservoir', 'year', 'month'])
+    joined['xy'] = joined['surface_temp'] * joined['log_toxic']
+    joined['xx'] = joined['surface_temp'] ** 2
+    sums = joined.groupby('reservoir', observed=True).agg(
+        n=('log_toxic', 'size'), x=('surface_temp', 'sum'), y=('log_toxic', 'sum'), xy=('xy', 'sum'), xx=('xx', 'sum'))
+    variance = sums['xx'] - sums['x'] ** 2 / sums['n']
+    response = pd.DataFrame({
+        'temp_slope': ((sums['xy'] - sums['x'] * sums['y'] / sums['n']) / variance.where(variance > 0)),
+        'surface_temp': surface.groupby('reservoir')['surface_temp'].mean()
+    })
+
+    features = seasonal.join(exceedance)
+    features.index = features.index.astype(str)
+    features = features.join(response)
+    # Réservoir sans température ou pente indéfinie : valeur médiane des autres réservoirs
+    return features.fillna(features.median()).fillna(0)
+
+def cluster_lakes(features, n_clusters=N_CLUSTERS, random_state=0):
+    """
+    Numéro de groupe de chaque réservoir (Series alignée sur features) et centres dans l'unité des caractéristiques
+    """
+    n_clusters = min(n_clusters, len(features))
+    scaler = StandardScaler()
+    scaled = scaler.fit_transform(features.to_numpy(dtype=float))
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=10,
+                            batch_size=max(256, n_clusters * 16))
+    labels = model.fit_predict(scaled)
+    centers = pd.DataFrame(scaler.inverse_transform(model.cluster_centers_), columns=features.columns)
+    return pd.Series(labels, index=features.index, name='cluster'), centers
+
+def build_clusters(n_clusters=N_CLUSTERS, taxa_file=TAXA_FILE, reservoir_file=RESERVOIR_FILE,
+                   output=CLUSTERS_FILE):
+    """
+    Calcule les caractéristiques, regroupe les réservoirs et écrit les affectations dans output
+    """
+    features = lake_features(load_taxa(taxa_file), read_merged())
+    labels, centers = cluster_lakes(features, n_clusters)
+    reservoirs = load_reservoirs(reservoir_file)
+
+    result = {
+        'features': list(features.columns),
+        'clusters': {
+            str(cluster): {
+                'size': int((labels == cluster).sum()),
+                'orange_rate': round(float(features.loc[labels == cluster, 'orange_rate'].mean()), 4),
+                'rouge_rate': round(float(features.loc[labels == cluster, 'rouge_rate'].mean()), 4),
+                'center': {name: round(float(value), 4) for name, value in centers.loc[cluster].items()}
+            }
+            for cluster in sorted(labels.unique())
+        },
+        'lakes': {
+            lake: {
+                'cluster': int(cluster),
+                **({'latitude': reservoirs[lake]['latitude'], 'longitude': reservoirs[lake]['longitude']}
+                   if lake in reservoirs else {})
+            }
+            for lake, cluster in labels.items()
+        }
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regroupement des réservoirs par profil de toxicité")
+    parser.add_argument("--clusters", type=int, default=N_CLUSTERS)
+    parser.add_argument("--output", default=CLUSTERS_FILE)
+    args = parser.parse_args()
+
+    result = build_clusters(args.clusters, output=args.output)
+    for cluster, summary in result['clusters'].items():
+        lakes = [lake for lake, entry in result['lakes'].items() if entry['cluster'] == int(cluster)]
+        print(f"Groupe {cluster} : {', '.join(lakes)} (ROUGE {summary['rouge_rate']:.0%}, ORANGE+ {summary['orange_rate']:.0%})")
+    print(f"Affectations : {args.output}")
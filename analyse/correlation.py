@@ -0,0 +1,203 @@
+"""
+Corrélations décalées entre température et densités de cyanobactéries, pour tous les réservoirs
+
+Chaque prélèvement (densités toxique et totale, en log10(1 + densité)) est associé :
+    - aux températures de l'eau de merged_data (ST surface, DT fond : moyennes mensuelles de
+      water-temp-do-data-final) du mois du prélèvement et des LAG_MONTHS mois précédents
+    - à la température de l'air moyenne sur la fenêtre de WINDOW_DAYS jours se terminant
+      LAG_DAYS jours avant le prélèvement, lue dans l'historique local de weather_store
+
+Les séries sont rangées dans des tableaux denses (réservoir × mois, réservoir × jour) : tous les
+décalages sont obtenus par indexation, et les coefficients de Pearson de tous les réservoirs, cibles,
+variables et décalages par sommes groupées en un seul calcul.
+
+Utilisation (depuis analyse/) :
+    python correlation.py --output correlations.csv
+    python correlation.py --lakes BHR BRR --lags-days 0 3 7 14 --ingest
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from backtest import RESERVOIR_FILE, TAXA_FILE, load_reservoirs
+from datasets import read_merged
+from fusion import load_taxa
+from presence import cyano_presence_all
+import weather_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from predictor import HOURLY_COLUMNS
+
+WATER_TYPES = ['ST', 'DT']
+LAG_MONTHS = [0, 1, 2]
+LAG_DAYS = [0, 7, 14, 21, 28]
+WINDOW_DAYS = weather_store.WINDOW_DAYS
+# En dessous, le coefficient n'est pas calculé
+MIN_SAMPLES = 6
+
+def sample_targets(presence):
+    """
+    Densités des prélèvements en log10(1 + densité) : {cible: tableau de N valeurs}
+    """
+    return {
+        'toxic': np.log10(1 + presence['toxic_density'].to_numpy(dtype=float)),
+        'total': np.log10(1 + presence['total_density'].to_numpy(dtype=float))
+    }
+
+def water_drivers(presence, lakes, water, lags=LAG_MONTHS, types=WATER_TYPES):
+    """
+    Températures de l'eau du mois du prélèvement décalé de lag mois : {(type, lag): tableau de N valeurs}
+    water : read_merged() (format long)
+    """
+    first_year = int(min(water['year'].min(), presence['date'].dt.year.min()))
+    months = (int(max(water['year'].max(), presence['date'].dt.year.max())) - first_year + 1) * 12
+
+    # Tableau (type, réservoir, mois depuis janvier de first_year), NaN hors mesures
+    water = water[water['type'].isin(types) & water['reservoir'].isin(lakes)]
+    cube = np.full((len(types), len(lakes), months), np.nan)
+    cube[pd.Index(types).get_indexer(water['type'].astype(str)),
+         pd.Index(lakes).get_indexer(water['reservoir'].astype(str)),
+         (water['year'].to_numpy(dtype=int) - first_year) * 12 + water['month'].cat.codes.to_numpy()] = water['value'].to_numpy()
+
+    lake_index = pd.Index(lakes).get_indexer(presence['reservoir'].astype(str))
+    sample_month = ((presence['date'].dt.year - first_year) * 12 + presence['date'].dt.month - 1).to_numpy()
+    # Décalages en une seule indexation : (décalages, N)
+    shifted = sample_month - np.asarray(lags)[:, np.newaxis]
+    values = cube[:, lake_index, shifted.clip(0)]
+    values[:, shifted < 0] = np.nan
+    return {(water_type, lag): values[t, i] for t, water_type in enumerate(types) for i, lag in enumerate(lags)}
+
+def air_drivers(presence, lakes, lags=LAG_DAYS, window_days=WINDOW_DAYS, store_dir=weather_store.STORE_DIR):
+    """
+    Température de l'air moyenne sur [date - lag - window_days, date - lag] : {('air', lag): tableau de N valeurs}
+    Seules les fenêtres entièrement couvertes par l'historique local sont renseignées
+    """
+    origin = (presence['date'].min() - pd.Timedelta(days=max(lags) + window_days)).normalize()
+    days = (presence['date'].max().normalize() - origin).days + 1
+
+    # Sommes et nombres d'heures renseignées par (réservoir, jour), une lecture de l'historique par lac
+    sums = np.zeros((len(lakes), days))
+    counts = np.zeros((len(lakes), days))
+    for i, lake in enumerate(lakes):
+        frame = weather_store.load_range(lake, origin, origin + pd.Timedelta(days=days - 1), store_dir)
+        if frame.empty:
+            continue
+        temperature = frame[HOURLY_COLUMNS['temperature']].to_numpy(dtype=float)
+        valid = ~np.isnan(temperature)
+        day = ((frame['time'] - origin).dt.days).to_numpy()[valid]
+        sums[i] = np.bincount(day, temperature[valid], minlength=days)
+        counts[i] = np.bincount(day, minlength=days)
+
+    # Moyennes journalières, puis moyennes glissantes par sommes cumulées le long des jours
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = np.where(counts > 0, sums / counts, np.nan)
+    width = window_days + 1
+    prefix = np.zeros((len(lakes), days + 1))
+    np.cumsum(np.nan_to_num(daily), axis=1, out=prefix[:, 1:])
+    covered = np.zeros((len(lakes), days + 1))
+    np.cumsum(~np.isnan(daily), axis=1, out=covered[:, 1:])
+    end = np.arange(width, days + 1)
+    rolling = np.full((len(lakes), days), np.nan)
+    complete = covered[:, end] - covered[:, end - width] == width
+    rolling[:, width - 1:] = np.where(complete, (prefix[:, end] - prefix[:, end - width]) / width, np.nan)
+
+    lake_index = pd.Index(lakes).get_indexer(presence['reservoir'].astype(str))
+    sample_day = ((presence['date'].dt.normalize() - origin).dt.days).to_numpy()
+    values = rolling[lake_index, sample_day - np.asarray(lags)[:, np.newaxis]]
+    return {('air', lag): values[i] for i, lag in enumerate(lags)}
+
+def lagged_correlations(targets, drivers, groups, min_samples=MIN_SAMPLES):
+    """
+    Pearson de chaque (groupe, cible, variable décalée) sur les paires renseignées
+    targets : {cible: N valeurs}, drivers : {(variable, décalage): N valeurs}, groups : N codes de réservoir
+    Retourne (n, r, p) : tableaux (groupes, cibles, variables)
+    """
+    order = np.argsort(groups, kind='stable')
+    groups = np.asarray(groups)[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+    y = np.stack(list(targets.values()))[:, np.newaxis, order]     # (T, 1, N)
+    x = np.stack(list(drivers.values()))[np.newaxis, :, order]     # (1, D, N)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    x = np.where(valid, x, 0)
+    y = np.where(valid, y, 0)
+
+    def grouped(values):
+        # Sommes par réservoir le long des prélèvements : (T, D, R) -> (R, T, D)
+        return np.moveaxis(np.add.reduceat(values, starts, axis=-1), -1, 0)
+
+    n = grouped(valid.astype(float))
+    sx, sy, sxy = grouped(x), grouped(y), grouped(x * y)
+    sxx, syy = grouped(x * x), grouped(y * y)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = n * sxy - sx * sy
+        r = covariance / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+        r = np.where(n >= min_samples, np.clip(r, -1, 1), np.nan)
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    p = 2 * stats.t.sf(np.abs(t), np.maximum(n - 2, 1))
+    return n.astype(int), r, np.where(np.isnan(r), np.nan, p)
+
+def correlations(lakes=None, lags_days=LAG_DAYS, lags_months=LAG_MONTHS, window_days=WINDOW_DAYS,
+                 ingest=False, taxa_file=TAXA_FILE, reservoir_file=RESERVOIR_FILE,
+                 store_dir=weather_store.STORE_DIR):
+    """
+    Table (reservoir, target, driver, lag, unit, n, r, p_value) de tous les réservoirs et décalages
+    ingest : télécharge d'abord les années manquantes de l'historique météo (sinon lecture locale seule)
+    """
+    taxa = load_taxa(taxa_file)
+    presence = cyano_presence_all(taxa)
+    lakes = lakes or sorted(str(lake) for lake in presence['reservoir'].unique())
+    presence = presence[presence['reservoir'].isin(lakes)].reset_index(drop=True)
+
+    if ingest:
+        reservoirs = load_reservoirs(reservoir_file)
+        dates = presence.groupby('reservoir', observed=True)['date']
+        weather_store.ingest({
+            lake: {**reservoirs[lake], 'years': weather_store.sample_years(dates.get_group(lake),
+                                                                             max(lags_days) + window_days)}
+            for lake in lakes if lake in reservoirs
+        }, store_dir)
+
+    targets = sample_targets(presence)
+    drivers = {
+        **water_drivers(presence, lakes, read_merged(), lags_months),
+        **air_drivers(presence, lakes, lags_days, window_days, store_dir)
+    }
+    n, r, p = lagged_correlations(targets, drivers, pd.Index(lakes).get_indexer(presence['reservoir'].astype(str)))
+
+    # Une ligne par (réservoir, cible, variable, décalage) ; les réservoirs sans prélèvement n'apparaissent pas
+    observed = np.unique(pd.Index(lakes).get_indexer(presence['reservoir'].astype(str)))
+    index = pd.MultiIndex.from_product([np.asarray(lakes)[observed], list(targets), range(len(drivers))],
+                                       names=['reservoir', 'target', 'driver_index'])
+    table = pd.DataFrame({'n': n.ravel(), 'r': r.ravel(), 'p_value': p.ravel()}, index=index).reset_index()
+    keys = list(drivers)
+    table.insert(2, 'driver', [keys[i][0] for i in table['driver_index']])
+    table.insert(3, 'lag', [keys[i][1] for i in table['driver_index']])
+    table.insert(4, 'unit', np.where(table['driver'] == 'air', 'jours', 'mois'))
+    return table.drop(columns='driver_index').round({'r': 4, 'p_value': 4})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corrélations décalées température / cyanobactéries par réservoir")
+    parser.add_argument("--lakes", nargs="*", help="codes des réservoirs (défaut : tous)")
+    parser.add_argument("--lags-days", nargs="*", type=int, default=LAG_DAYS, help="décalages de la température de l'air")
+    parser.add_argument("--lags-months", nargs="*", type=int, default=LAG_MONTHS, help="décalages de la température de l'eau")
+    parser.add_argument("--window-days", type=int, default=WINDOW_DAYS)
+    parser.add_argument("--ingest", action="store_true", help="télécharge les années manquantes de l'historique météo")
+    parser.add_argument("--output", help="fichier CSV de résultats (défaut : meilleur décalage sur la sortie standard)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = correlations(args.lakes, args.lags_days, args.lags_months, args.window_days, args.ingest)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"{len(table)} corrélations en {time.perf_counter() - started:.2f} s : {args.output}")
+    else:
+        # Décalage de plus forte corrélation (en valeur absolue) par réservoir, cible et variable
+        best = table.dropna(subset=['r']).assign(strength=lambda df: df['r'].abs())
+        best = best.loc[best.groupby(['reservoir', 'target', 'driver'])['strength'].idxmax()].drop(columns='strength')
+        print(best.to_string(index=False))
@@ -0,0 +1,144 @@
+"""
+Cache Parquet des classeurs Excel de data2/
+
+Chaque feuille est convertie une fois en Parquet typé (date parsée, réservoir en catégorie,
+colonnes numériques avec "na" converties en float). read_sheet relit le cache tant qu'il est
+plus récent que le fichier Excel source.
+
+merged_data.csv (une colonne par réservoir) est relu au format long (year, month, type, reservoir, value)
+par read_merged, avec le même principe de cache.
+
+Ingestion de tous les classeurs et de merged_data.csv (depuis analyse/) :
+    python datasets.py
+"""
+import glob
+import os
+import sys
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+ANALYSE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ANALYSE_DIR, 'data2')
+CACHE_DIR = os.path.join(ANALYSE_DIR, 'cache', 'sheets')
+
+NA_STRINGS = {'na', 'n/a', 'nan', ''}
+CATEGORY_COLUMNS = {'reservoir', 'Reservoir'}
+
+MERGED_FILE = os.path.join(ANALYSE_DIR, 'merged_data.csv')
+MERGED_KEYS = ['Year', 'Month', 'Type']
+# Colonnes de merged_data.csv qui ne sont pas des réservoirs : moyennes par groupe de réservoirs et erreurs types
+AGGREGATE_COLUMNS = ['forest', 'forSE', 'agstrat', 'agstratSE', 'agnonstrat', 'agnonstratSE', 'agnonSE']
+MONTHS = pd.CategoricalDtype(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+                             ordered=True)
+CHUNK_ROWS = 10_000
+
+def cache_path(file_path, sheet_name):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{name}__{sheet_name}.parquet")
+
+def typed_frame(df):
+    """
+    Types explicites pour le stockage en colonnes
+    """
+    df = df.copy()
+    df.columns = [str(column) for column in df.columns]
+    for column in df.columns:
+        values = df[column]
+        if column == 'date':
+            df[column] = pd.to_datetime(values)
+        elif column in CATEGORY_COLUMNS:
+            df[column] = values.astype('category')
+        elif values.dtype == object or pd.api.types.is_string_dtype(values):
+            numeric = pd.to_numeric(values, errors='coerce')
+            rejected = values[numeric.isna() & values.notna()]
+            if rejected.astype(str).str.strip().str.lower().isin(NA_STRINGS).all() and numeric.notna().any():
+                df[column] = numeric
+            else:
+                df[column] = values.astype('string')
+    return df
+
+def convert_sheet(file_path, sheet_name):
+    """
+    Lit une feuille Excel, la type et l'écrit dans le cache Parquet
+    """
+    df = typed_frame(pd.read_excel(file_path, sheet_name=sheet_name))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path(file_path, sheet_name), index=False)
+    return df
+
+def read_sheet(file_path, sheet_name):
+    """
+    Équivalent de pd.read_excel(file_path, sheet_name) passant par le cache Parquet
+    """
+    path = cache_path(file_path, sheet_name)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(file_path):
+        return pd.read_parquet(path)
+    return convert_sheet(file_path, sheet_name)
+
+def melt_chunk(chunk, value_columns):
+    """
+    Bloc large de merged_data.csv -> lignes (year, month, type, reservoir, value), valeurs manquantes retirées
+    """
+    long = chunk.melt(id_vars=MERGED_KEYS, value_vars=value_columns, var_name='reservoir', value_name='value')
+    long = long[long['value'].notna()]
+    return pd.DataFrame({
+        'year': long['Year'].to_numpy(dtype='int16'),
+        'month': pd.Categorical(long['Month'], dtype=MONTHS),
+        'type': pd.Categorical(long['Type']),
+        'reservoir': pd.Categorical(long['reservoir'], categories=value_columns),
+        'value': long['value'].to_numpy(dtype='float32')
+    })
+
+def convert_merged(file_path=MERGED_FILE, chunksize=CHUNK_ROWS):
+    """
+    Lit merged_data.csv par blocs de chunksize lignes, le convertit au format long et l'écrit dans le cache
+    Le tableau large n'est jamais chargé en entier ; les lignes sont triées par réservoir puis par date
+    """
+    value_columns = [column for column in pd.read_csv(file_path, nrows=0).columns if column not in MERGED_KEYS]
+    chunks = pd.read_csv(file_path, chunksize=chunksize, na_values=list(NA_STRINGS), keep_default_na=True,
+                         dtype={**{column: 'float32' for column in value_columns}, 'Month': str, 'Type': str})
+    parts = [melt_chunk(chunk, value_columns) for chunk in chunks]
+
+    # Les types de mesure (ST, DT, DO...) ne sont connus qu'à la lecture : catégories réunies bloc par bloc
+    types = union_categoricals([part['type'] for part in parts])
+    df = pd.concat([part.drop(columns='type') for part in parts], ignore_index=True)
+    df.insert(2, 'type', types)
+    df = df.sort_values(['reservoir', 'type', 'year', 'month'], ignore_index=True)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path(file_path, 'long'), index=False, row_group_size=50_000)
+    return df
+
+def read_merged(reservoir=None, aggregates=False, file_path=MERGED_FILE):
+    """
+    merged_data.csv au format long : year (int16), month, type, reservoir (catégories), value (float32)
+    reservoir : ne lit que ce réservoir (ou cette colonne agrégée) ; aggregates : garde les colonnes
+    de AGGREGATE_COLUMNS en plus des réservoirs
+    """
+    path = cache_path(file_path, 'long')
+    if not (os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(file_path)):
+        convert_merged(file_path)
+
+    if reservoir is not None:
+        return pd.read_parquet(path, filters=[('reservoir', '==', reservoir)])
+    df = pd.read_parquet(path)
+    if not aggregates:
+        df = df[~df['reservoir'].isin(AGGREGATE_COLUMNS)]
+        df = df.assign(reservoir=df['reservoir'].cat.remove_unused_categories())
+    return df.reset_index(drop=True)
+
+def ingest(file_paths):
+    """
+    Convertit toutes les feuilles des classeurs donnés
+    """
+    for file_path in file_paths:
+        for sheet_name in pd.ExcelFile(file_path).sheet_names:
+            df = convert_sheet(file_path, sheet_name)
+            print(f"{os.path.basename(file_path)} / {sheet_name} : {len(df)} lignes")
+
+if __name__ == "__main__":
+    ingest(sys.argv[1:] or sorted(glob.glob(os.path.join(DATA_DIR, '*.xls'))))
+    if not sys.argv[1:]:
+        df = convert_merged()
+        print(f"{os.path.basename(MERGED_FILE)} : {len(df)} lignes au format long")
@@ -1,31 +1,39 @@
+import os
+import sys
 import pandas as pd
 from datetime import datetime, timedelta
 import requests
+from datasets import read_sheet
+from presence import RISK_THRESHOLDS, cyano_presence_all, risk_levels
+import weather_store
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import predictor
+from risk import evaluate_conditions
+from rolling import window_bounds
+
+def load_taxa(file_path):
+    # Feuille typée (date parsée) lue depuis le cache Parquet
+    return read_sheet(file_path, 'All_data')
 
 def analyze_cyano_presence(file_path, target_lake):
-    df = pd.read_excel(file_path, sheet_name='All_data')
-    df['date'] = pd.to_datetime(df['date'])
-    lake_data = df[df['reservoir'] == target_lake]
-
-    daily_data = []
-    for date, group in lake_data.groupby('date'):
-        toxic_samples = group[group['toxin'] == 1]
-        daily_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'total_density': group['density_cells/ml'].sum(),
-            'toxic_density': toxic_samples['density_cells/ml'].sum(),
-            'risk_level': get_risk_level(toxic_samples['density_cells/ml'].sum())
-        })
-    return pd.DataFrame(daily_data).sort_values('date')
+    return cyano_presence(load_taxa(file_path), target_lake)
+
+def cyano_presence(df, target_lake):
+    daily = cyano_presence_all(df[df['reservoir'] == target_lake], RISK_THRESHOLDS)
+    daily['date'] = daily['date'].dt.strftime('%Y-%m-%d')
+    return daily.drop(columns='reservoir')
 
 def get_risk_level(toxic_density):
-    if toxic_density > 2000:
-        return "ROUGE"
-    elif toxic_density > 1000:
-        return "ORANGE"
-    return "VERT"
+    return str(risk_levels(toxic_density, RISK_THRESHOLDS))
+
+def get_weather_data(latitude, longitude, date, lake=None):
+    # Fenêtre lue dans l'historique local si le lac a été ingéré (python weather_store.py)
+    if lake is not None:
+        weather_data = weather_store.window(lake, date)
+        if weather_data is not None:
+            return weather_data
 
-def get_weather_data(latitude, longitude, date):
     end_date = datetime.strptime(date, "%Y-%m-%d")
     start_date = end_date - timedelta(days=7)
     
@@ -55,6 +63,21 @@ def get_conditions(weather_data):
         'soil_temp': df['soil_temp'].mean()
     }
 
+def stored_conditions(lake, dates, window_days=7, store_dir=weather_store.STORE_DIR):
+    """
+    Conditions (comme get_conditions, variations météo comprises) des dates dont la fenêtre est
+    entièrement dans l'historique local, calculées par predictor.conditions_series en un seul passage
+    """
+    dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+    if not len(dates):
+        return {}
+    frame = weather_store.load_range(lake, dates.min() - pd.Timedelta(days=window_days), dates.max(), store_dir)
+    days = [pd.Timestamp(date).strftime("%Y-%m-%d") for date in dates]
+    conditions = predictor.conditions_series({'hourly': frame}, days, window_days)
+    lower, upper = window_bounds(frame['time'], dates, window_days)
+    complete = upper - lower == (window_days + 1) * 24
+    return {day: conditions[day] for i, day in enumerate(days) if complete[i]}
+
 def evaluate_risk(latitude, longitude, lake_name, lake_type, stratification):
     cyano_data = analyze_cyano_presence("./data2/cyanotoxin-taxa-data-xlsx-3.xls", lake_name)
 
@@ -68,9 +91,14 @@ def evaluate_risk(latitude, longitude, lake_name, lake_type, stratification):
     count_orange_to_rouge = 0
     count_orange_to_vert = 0
 
+    # Fenêtres couvertes par l'historique local : un seul passage ; les autres passent par l'API
+    # (mêmes variables horaires et même calcul que l'application : conditions identiques dans les deux cas)
+    conditions_by_date = stored_conditions(lake_name, cyano_data['date'])
+
     for i, row in cyano_data.iterrows():
-        weather_data = get_weather_data(latitude, longitude, row['date'])
-        weather_conditions = get_conditions(weather_data)
+        weather_conditions = conditions_by_date.get(row['date'])
+        if weather_conditions is None:
+            weather_conditions = predictor.get_conditions(predictor.get_historical_data(latitude, longitude, row['date']))
         risk_analysis = evaluate_risk_level(weather_conditions, lake_type, stratification)
 
         # if (risk_analysis[0] == "ROUGE" and row['risk_level'] == "VERT") or (risk_analysis[0] == "VERT" and row['risk_level'] == "ROUGE"):
@@ -137,67 +165,11 @@ def evaluate_risk_level(conditions, lake_type, stratification):
     """
     Ajuste les seuils de risque selon le type de lac et les variations météo
     Types: 'forest', 'agriculture', 'urban'
+    Seuils fixes sans stratification : même moteur de score que l'application
     """
-    risk_score = 0
-    high_risk = 0
-    
-    # Ajustement des seuils selon le type de lac
-    temp_threshold = {
-        'forest': {'base': 23, 'high': 25},
-        'agriculture': {'base': 24, 'high': 26},
-        'urban': {'base': 25, 'high': 27}
-    }[lake_type]
-    
-    # Seuils fixes sans stratification
-    humidity_threshold = {'base': 65, 'high': 75}
-    wind_threshold = {'base': 10, 'high': 7}
-
-    # Température
-    if conditions['temp'] >= temp_threshold['base']:
-        risk_score += 1
-        if conditions['temp'] >= temp_threshold['high']:
-            high_risk += 1
-            
-    # Humidité
-    if conditions['humidity'] > humidity_threshold['base']:
-        risk_score += 1
-        if conditions['humidity'] > humidity_threshold['high']:
-            high_risk += 1
-    
-    # Vent
-    if conditions['wind'] < wind_threshold['base']:
-        risk_score += 1
-        if conditions['wind'] < wind_threshold['high']:
-            high_risk += 1
-            
-    # Sol
-    if conditions.get('soil_temp'):
-        if conditions['soil_temp'] > 24:
-            risk_score += 1
-            if conditions['soil_temp'] > 26:
-                high_risk += 1
-
-    # Score des variations météo
-    if 'weather_score' in conditions:
-        risk_score += conditions['weather_score'] * 0.5  # Ajoute 0.5 point par niveau de variation
-        if conditions['weather_score'] >= 2:
-            high_risk += 1
-
-    # Messages personnalisés selon les conditions
-    weather_message = ""
-    if 'weather_description' in conditions and conditions['weather_description'] != "conditions stables":
-        weather_message = f" - Instabilité météo : {conditions['weather_description']}"
-
-    # Just get  weather_description, weather_score, wind, temp, humidity, precip
-    conditions = {k: v for k, v in conditions.items() if k in ['weather_description', 'wind', 'temp', 'humidity', 'precip']}
-    # Drapeaux
-    if risk_score <= 1.5:  # Seuil ajusté pour tenir compte des variations
-        return "VERT", f"Risque faible{weather_message}", conditions
-    elif risk_score <= 2.5 or high_risk == 0:
-        return "ORANGE", f"Conditions favorables - Surveillance recommandée{weather_message}", conditions
-    else:
-        return "ROUGE", f"Conditions très favorables - Présence probable{weather_message}", conditions
+    return evaluate_conditions(conditions, lake_type)
       
-evaluate_risk(37.3386, -83.4707, "BHR", "forest", "strong")
-evaluate_risk(36.892, -86.1225, "BRR", "agriculture", "strong")
+if __name__ == "__main__":
+    evaluate_risk(37.3386, -83.4707, "BHR", "forest", "strong")
+    evaluate_risk(36.892, -86.1225, "BRR", "agriculture", "strong")
 
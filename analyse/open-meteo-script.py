@@ -1,67 +1,37 @@
+import os
+import sys
 import requests
 from datetime import datetime, timedelta
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import predictor
+from risk import DEFAULT_THRESHOLDS, evaluate_conditions
+from weather_cache import WeatherCache
+
+# Seuils d'humidité et de vent selon la stratification, coupures du score sans variations météo
+STRATIFICATION_THRESHOLDS = {
+    stratification: {
+        **DEFAULT_THRESHOLDS,
+        'humidity': humidity,
+        'wind': wind,
+        'cuts': (1, 2)
+    }
+    for stratification, humidity, wind in [
+        ('strong', (70, 80), (8, 5)),
+        ('weak', (65, 75), (10, 7)),
+        ('none', (60, 70), (12, 9))
+    ]
+}
+
 def evaluate_risk_level(conditions, lake_type, stratification):
     """
     Ajuste les seuils de risque selon le type de lac
     Types: 'forest', 'agriculture', 'urban'
     Stratification: 'strong', 'weak', 'none'
     """
-    risk_score = 0
-    high_risk = 0
-    
-    # Ajustement des seuils selon le type de lac
-    temp_threshold = {
-        'forest': {'base': 23, 'high': 25},
-        'agriculture': {'base': 24, 'high': 26},
-        'urban': {'base': 25, 'high': 27}
-    }[lake_type]
-    
-    humidity_threshold = {
-        'strong': {'base': 70, 'high': 80},
-        'weak': {'base': 65, 'high': 75},
-        'none': {'base': 60, 'high': 70}
-    }[stratification]
-    
-    wind_threshold = {
-        'strong': {'base': 8, 'high': 5},
-        'weak': {'base': 10, 'high': 7},
-        'none': {'base': 12, 'high': 9}
-    }[stratification]
-
-    # Température
-    if conditions['temp'] >= temp_threshold['base']:
-        risk_score += 1
-        if conditions['temp'] >= temp_threshold['high']:
-            high_risk += 1
-            
-    # Humidité
-    if conditions['humidity'] > humidity_threshold['base']:
-        risk_score += 1
-        if conditions['humidity'] > humidity_threshold['high']:
-            high_risk += 1
-    
-    # Vent
-    if conditions['wind'] < wind_threshold['base']:
-        risk_score += 1
-        if conditions['wind'] < wind_threshold['high']:
-            high_risk += 1
-            
-    if(conditions['soil_temp']):
-        # Sol (commun à tous les types)
-        if conditions['soil_temp'] > 24:
-            risk_score += 1
-            if conditions['soil_temp'] > 26:
-                high_risk += 1
-
-    # Drapeaux
-    if risk_score <= 1:
-        return "VERT", "Risque faible"
-    elif risk_score <= 2 or high_risk == 0:
-        return "ORANGE", "Conditions favorables - Surveillance recommandée"
-    else:
-        return "ROUGE", "Conditions très favorables - Présence probable"
+    flag, message, _ = evaluate_conditions(conditions, lake_type, STRATIFICATION_THRESHOLDS[stratification])
+    return flag, message
 
 
 def get_weather_data(latitude, longitude, date):
@@ -112,16 +82,54 @@ def get_conditions(weather_data):
         'soil_moisture': df['soil_moisture'].mean()
     }
 
+def window_means(latitude, longitude, dates, window_days=7):
+    """
+    Conditions moyennes (comme get_conditions) de chaque date, calculées par fenêtres glissantes
+    sur une seule récupération de toute la période
+    """
+    dates = sorted(dates)
+    start = (datetime.strptime(dates[0], "%Y-%m-%d") - timedelta(days=window_days)).strftime("%Y-%m-%d")
+    daily_data = predictor.fetch_daily("archive", latitude, longitude, start, dates[-1],
+                                       cache=WeatherCache("./cache/weather_cache.sqlite"))
+    means = predictor.rolling_means(predictor.merge_days(daily_data.values()), dates, window_days)
+    return {
+        date: {
+            'temp': means['temperature'][i],
+            'humidity': means['humidity'][i],
+            'wind': means['wind_speed'][i],
+            'soil_temp': means['soil_temp'][i],
+            'precip': means['precipitation'][i],
+            'soil_moisture': means['soil_moisture'][i]
+        }
+        for i, date in enumerate(dates)
+    }
+
+def print_risk(risk_analysis, lake_type, stratification):
+    print(f"\nType de lac: {lake_type}")
+    print(f"Stratification: {stratification}")
+    print(f"Drapeau : {risk_analysis[0]}")
+    print(f"Message : {risk_analysis[1]}")
+
+def main_series(latitude, longitude, dates, lake_type, stratification):
+    """
+    Comme main pour une série de dates, avec un seul appel météo pour toute la période
+    """
+    try:
+        results = {}
+        for date, conditions in window_means(latitude, longitude, dates).items():
+            results[date] = evaluate_risk_level(conditions, lake_type, stratification)
+            print_risk(results[date], lake_type, stratification)
+        return results
+    except Exception as e:
+        print(f"Erreur : {e}")
+
 def main(latitude, longitude, date, lake_type, stratification):
     try:
         weather_data = get_weather_data(latitude, longitude, date)
         conditions = get_conditions(weather_data)
         risk_analysis = evaluate_risk_level(conditions, lake_type, stratification)
         
-        print(f"\nType de lac: {lake_type}")
-        print(f"Stratification: {stratification}")
-        print(f"Drapeau : {risk_analysis[0]}")
-        print(f"Message : {risk_analysis[1]}")
+        print_risk(risk_analysis, lake_type, stratification)
         # print("\nConditions :")
         # for key, value in conditions.items():
         #     print(f"{key}: {value:.2f}")
@@ -146,11 +154,8 @@ if __name__ == "__main__":
     # main(latitude=40.7143, longitude=-85.9561, date="1988-07-15") # MSR
     # main(latitude=38.434, longitude=-86.7046, date="1988-07-15") # PRR
 
-    date = "2010-01-15"
-    for i in range(12):
-        print
-        main(latitude=37.3386, longitude=-83.4707, date=date, lake_type="forest", stratification="strong")
-        # add 1 month
-        date = datetime.strptime(date, "%Y-%m-%d") + timedelta(days=30)
-        date = date.strftime("%Y-%m-%d")
+    # 12 dates espacées de 30 jours, évaluées sur une seule récupération météo
+    start = datetime.strptime("2010-01-15", "%Y-%m-%d")
+    dates = [(start + timedelta(days=30 * i)).strftime("%Y-%m-%d") for i in range(12)]
+    main_series(latitude=37.3386, longitude=-83.4707, dates=dates, lake_type="forest", stratification="strong")
 
@@ -0,0 +1,31 @@
+"""
+Densités de cyanobactéries (totales et toxiques) par réservoir et par date, en une seule agrégation
+"""
+import numpy as np
+import pandas as pd
+
+# Densité toxique (cellules/ml) au-delà de laquelle le drapeau observé passe ORANGE, puis ROUGE
+RISK_THRESHOLDS = (1000, 2000)
+
+def risk_levels(toxic_density, thresholds=RISK_THRESHOLDS):
+    """
+    Drapeau observé pour un tableau de densités toxiques
+    """
+    orange, rouge = thresholds
+    return np.select([toxic_density > rouge, toxic_density > orange], ["ROUGE", "ORANGE"], "VERT")
+
+def cyano_presence_all(taxa, thresholds=RISK_THRESHOLDS):
+    """
+    Table (reservoir, date, total_density, toxic_density, risk_level) pour tous les réservoirs et dates
+    taxa : feuille All_data de cyanotoxin-taxa-data (date déjà convertie)
+    """
+    density = taxa['density_cells/ml']
+    samples = pd.DataFrame({
+        'reservoir': taxa['reservoir'],
+        'date': taxa['date'],
+        'total_density': density,
+        'toxic_density': density.where(taxa['toxin'] == 1, 0.0)
+    })
+    daily = samples.groupby(['reservoir', 'date'], observed=True, sort=True).sum().reset_index()
+    daily['risk_level'] = risk_levels(daily['toxic_density'].to_numpy(), thresholds)
+    return daily
@@ -0,0 +1,151 @@
+"""
+Historique météo horaire local des réservoirs, partitionné par lac et par année
+
+Chaque année d'un lac est téléchargée une seule fois depuis l'archive Open-Meteo (un appel par
+année) et écrite dans cache/weather/<lac>/<année>.parquet. Les fenêtres d'analyse sont ensuite
+découpées dans ces fichiers, sans nouvel appel à l'API.
+
+Ingestion des années couvertes par les prélèvements (depuis analyse/) :
+    python weather_store.py --lakes BHR BRR
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+import http_client
+from predictor import BASE_URLS, HOURLY_VARIABLES
+
+ANALYSE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(ANALYSE_DIR, 'cache', 'weather')
+
+# Jours précédant un prélèvement inclus dans sa fenêtre météo
+WINDOW_DAYS = 7
+
+_partitions = {}
+
+def partition_path(lake, year, store_dir=STORE_DIR):
+    return os.path.join(store_dir, lake, f"{year}.parquet")
+
+def needs_ingest(lake, year, store_dir=STORE_DIR):
+    """
+    Une année passée déjà stockée est complète ; l'année en cours est toujours rafraîchie
+    """
+    return not os.path.exists(partition_path(lake, year, store_dir)) or year >= date.today().year
+
+def ingest_year(task):
+    """
+    Télécharge une année complète d'un lac et l'écrit dans sa partition
+    task : (lake, latitude, longitude, year, store_dir)
+    """
+    lake, latitude, longitude, year, store_dir = task
+    end_date = min(date(year, 12, 31), date.today() - timedelta(days=1))
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "start_date": f"{year}-01-01",
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "hourly": HOURLY_VARIABLES
+    }
+    hourly = http_client.get_json(BASE_URLS["archive"], params)['hourly']
+    frame = pd.DataFrame({'time': pd.to_datetime(hourly['time'])})
+    for variable in HOURLY_VARIABLES:
+        frame[variable] = pd.to_numeric(pd.Series(hourly[variable], dtype=object), errors='coerce')
+
+    path = partition_path(lake, year, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    frame.to_parquet(path, index=False)
+    return len(frame)
+
+def ingest(lakes, store_dir=STORE_DIR):
+    """
+    Télécharge les partitions manquantes
+    lakes : {lac: {'latitude', 'longitude', 'years'}}
+    Retourne le nombre de partitions téléchargées
+    """
+    tasks = [
+        (lake, lake_info['latitude'], lake_info['longitude'], year, store_dir)
+        for lake, lake_info in lakes.items()
+        for year in sorted(lake_info['years'])
+        if needs_ingest(lake, year, store_dir)
+    ]
+    http_client.map_concurrent(ingest_year, tasks)
+    return len(tasks)
+
+def sample_years(dates, window_days=WINDOW_DAYS):
+    """
+    Années couvertes par les fenêtres [date - window_days, date] des prélèvements
+    """
+    years = set()
+    for sample_date in pd.to_datetime(pd.Series(list(dates))):
+        years.update({(sample_date - timedelta(days=window_days)).year, sample_date.year})
+    return years
+
+def load_partition(lake, year, store_dir=STORE_DIR):
+    """
+    Partition d'une année, gardée en mémoire tant que le fichier ne change pas
+    Retourne None si l'année n'a pas été ingérée
+    """
+    path = partition_path(lake, year, store_dir)
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    cached = _partitions.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, pd.read_parquet(path))
+        _partitions[path] = cached
+    return cached[1]
+
+def load_range(lake, start_date, end_date, store_dir=STORE_DIR):
+    """
+    Données horaires stockées de start_date 00:00 à end_date 23:00 (inclus)
+    """
+    start = pd.Timestamp(start_date)
+    end = pd.Timestamp(end_date) + pd.Timedelta(hours=23)
+    frames = [load_partition(lake, year, store_dir) for year in range(start.year, end.year + 1)]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame(columns=['time', *HOURLY_VARIABLES])
+
+    frame = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    times = frame['time'].to_numpy()
+    lower = np.searchsorted(times, start.to_datetime64(), side='left')
+    upper = np.searchsorted(times, end.to_datetime64(), side='right')
+    return frame.iloc[lower:upper]
+
+def window(lake, sample_date, window_days=WINDOW_DAYS, store_dir=STORE_DIR):
+    """
+    Fenêtre météo d'un prélèvement au format de réponse Open-Meteo, lue dans le stockage local
+    Retourne None si la fenêtre n'est pas entièrement couverte
+    """
+    end = datetime.strptime(sample_date, "%Y-%m-%d")
+    start = end - timedelta(days=window_days)
+    frame = load_range(lake, start, end, store_dir)
+    if len(frame) < (window_days + 1) * 24:
+        return None
+
+    hourly = {'time': frame['time'].dt.strftime("%Y-%m-%dT%H:%M").tolist()}
+    for variable in HOURLY_VARIABLES:
+        hourly[variable] = [None if np.isnan(value) else value for value in frame[variable].tolist()]
+    return {'hourly': hourly}
+
+if __name__ == "__main__":
+    from backtest import RESERVOIR_FILE, TAXA_FILE, load_reservoirs
+    from fusion import load_taxa
+
+    parser = argparse.ArgumentParser(description="Ingestion de l'historique météo horaire des réservoirs")
+    parser.add_argument("--lakes", nargs="*", help="codes des réservoirs (défaut : tous)")
+    args = parser.parse_args()
+
+    taxa = load_taxa(TAXA_FILE)
+    reservoirs = load_reservoirs(RESERVOIR_FILE)
+    dates = taxa.groupby('reservoir', observed=True)['date'].unique()
+    lakes = {
+        lake: {**reservoirs[lake], 'years': sample_years(dates[lake])}
+        for lake in (args.lakes or [lake for lake in reservoirs if lake in dates.index])
+    }
+    print(f"{ingest(lakes)} partitions téléchargées dans {STORE_DIR}")
@@ -1,12 +1,77 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
-import predictor
-from datetime import datetime, timedelta
-from data import DataManager
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, g, Response
+import metrics
+from datetime import datetime
+from data import create_data_manager
+from lazy import lazy_import
+from prewarm import Prewarmer, ResultStore
+from priors import ClusterPriors
+from response_cache import ResponseCache
+from weather_cache import FORECAST_TTL, snap_to_grid
+import logging
+import os
 import secrets
+import time
+
+# Niveau de log réglable : CYANO_LOG_LEVEL=DEBUG affiche aussi le détail des prédictions
+logging.basicConfig(level=os.environ.get("CYANO_LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(name)s : %(message)s")
+logger = logging.getLogger(__name__)
+
+# numpy et requests ne sont importés qu'à la première prédiction (CYANO_PRELOAD=1 pour tout charger au démarrage)
+predictor = lazy_import("predictor")
+http_client = lazy_import("http_client")
+grid = lazy_import("grid")
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)  # Clé secrète pour les sessions
-data_manager = DataManager()
+data_manager = create_data_manager()
+
+REQUEST_SECONDS = metrics.histogram("cyano_http_request_seconds", "Durée des requêtes HTTP",
+                                    ["endpoint", "method", "status"])
+
+PREDICT_CACHE = metrics.counter("cyano_predict_cache_total", "Réponses de /predict lues dans le cache ou calculées",
+                                ["result"])
+
+def datamanager_cache_metrics():
+    # Cache de lecture des fichiers JSON (stockage CYANO_STORAGE=json uniquement)
+    stats = data_manager.cache_stats()
+    return [
+        "# TYPE cyano_datamanager_cache_hits_total counter",
+        f"cyano_datamanager_cache_hits_total {stats['hits']}",
+        "# TYPE cyano_datamanager_cache_misses_total counter",
+        f"cyano_datamanager_cache_misses_total {stats['misses']}"
+    ]
+
+if hasattr(data_manager, "cache_stats"):
+    metrics.register_collector(datamanager_cache_metrics)
+
+# Prévisions pré-calculées en arrière-plan pour tous les lacs enregistrés
+results_store = ResultStore()
+prewarmer = Prewarmer(data_manager, results_store)
+# Réponses JSON de /predict, valides tant que les prévisions dont elles sont issues
+response_cache = ResponseCache()
+# Groupe de toxicité des réservoirs étudiés (analyse/clusters.py), ajouté à titre indicatif aux réponses de /predict
+cluster_priors = ClusterPriors()
+# Carte régionale (/grid) : tuiles calculées et index spatial des lacs enregistrés, créés au premier appel
+grid_state = {}
+# Sous le rechargeur de Flask, seul le processus qui sert les requêtes lance le pré-calcul
+if os.environ.get("CYANO_PREWARM", "1") == "1" and (__name__ != '__main__' or os.environ.get("WERKZEUG_RUN_MAIN") == "true"):
+    prewarmer.start()
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if 'started' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.started, endpoint=request.endpoint or "inconnu",
+                                method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics_export():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route('/')
 def home():
@@ -65,6 +130,8 @@ def lakes():
             lake_type
         )
         
+        if success and 'lake_index' in grid_state:
+            grid_state['lake_index'].invalidate(session['username'])
         if not success:
             return render_template('lakes.html', 
                                  error=message, 
@@ -73,46 +140,119 @@ def lakes():
     return render_template('lakes.html', 
                          lakes=data_manager.get_user_lakes(session['username']))
 
-@app.route('/predict', methods=['POST'])
+@app.route('/lakes/risk')
+def lakes_risk():
+    if 'username' not in session:
+        return jsonify({'success': False, 'error': 'Non authentifié'}), 401
+
+    # Prévisions sur 7 jours de tous les lacs de l'utilisateur : pré-calculées si possible,
+    # les autres en une seule requête
+    start = datetime.now().strftime('%Y-%m-%d')
+    user_lakes = data_manager.get_user_lakes(session['username'])
+    precomputed = [
+        (results_store.get(lake['latitude'], lake['longitude'], start, 7, lake['type']) or (None, None))[0]
+        for lake in user_lakes
+    ]
+    missing = [lake for lake, predictions in zip(user_lakes, precomputed) if predictions is None]
+    computed = iter(predictor.predict_lakes(missing, start, 7) if missing else [])
+    lakes = [
+        next(computed) if predictions is None else {**lake, 'predictions': predictions}
+        for lake, predictions in zip(user_lakes, precomputed)
+    ]
+    response = jsonify({
+        'success': True,
+        'lakes': lakes
+    })
+    # Open-Meteo indisponible pour une partie des lacs : le client peut réessayer après Retry-After
+    if missing and any(lake.get('error') == http_client.UNAVAILABLE_MESSAGE for lake in lakes):
+        response.headers['Retry-After'] = str(http_client.RESET_TIMEOUT)
+    return response
+
+@app.route('/grid')
+def risk_grid():
+    if 'username' not in session:
+        return jsonify({'success': False, 'error': 'Non authentifié'}), 401
+
+    try:
+        bbox = [float(request.args[name]) for name in ('south', 'west', 'north', 'east')]
+        lake_type = request.args.get('lakeType', 'forest')
+        if not grid_state:
+            grid_state.update(tile_cache=grid.TileCache(), lake_index=grid.LakeIndex(data_manager))
+        result = grid.risk_grid(*bbox, lake_type, grid_state['tile_cache'], grid_state['lake_index'],
+                                session['username'])
+        return jsonify({'success': True, **result})
+
+    except http_client.UpstreamError as e:
+        logger.warning("Erreur app grid : %s", e)
+        response = jsonify({'success': False, 'error': http_client.UNAVAILABLE_MESSAGE})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after or http_client.RESET_TIMEOUT)
+        return response
+
+    except Exception as e:
+        logger.error("Erreur app grid : %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/predict', methods=['GET', 'POST'])
 def predict():
     if 'username' not in session:
         return jsonify({'success': False, 'error': 'Non authentifié'}), 401
     
     try:
-        data = request.form
+        data = request.values
         latitude = float(data['latitude'])
         longitude = float(data['longitude'])
         lake_type = data['lakeType']
 
-        predictions = []
-        current_date = datetime.now()
-        
-        for i in range(7):
-            date = current_date + timedelta(days=i)
-            date_str = date.strftime('%Y-%m-%d')
-            
-            risk_analysis = predictor.predict_for_date(
-                latitude, 
-                longitude, 
-                date_str, 
-                lake_type
-            )
-            print(risk_analysis)
-            
-            predictions.append({
-                'date': date_str,
-                'flag': risk_analysis[0],
-                'message': risk_analysis[1],
-                'conditions': risk_analysis[2]
-            })
-        print(predictions)
-        return jsonify({
-            'success': True,
-            'predictions': predictions
+        # Réponse déjà calculée pour cette maille, ce type de lac et la même émission des prévisions
+        start = datetime.now().strftime('%Y-%m-%d')
+        key = (snap_to_grid(latitude, longitude), lake_type, start)
+        issued_at = predictor.forecast_issued_at(latitude, longitude, start, 7)
+        cached = response_cache.get(key + (issued_at,)) if issued_at is not None else None
+        PREDICT_CACHE.inc(result="hit" if cached else "miss")
+
+        if cached is None:
+            # Toute la fenêtre de 7 jours est récupérée en un seul appel Open-Meteo
+            # Résultat pré-calculé seulement s'il est issu des prévisions actuellement en cache (un autre
+            # worker a pu les rafraîchir depuis) : la réponse est mise en cache sous cette émission
+            precomputed = results_store.get(latitude, longitude, start, 7, lake_type)
+            if precomputed is not None and issued_at is not None and precomputed[1] == issued_at:
+                predictions = precomputed[0]
+            else:
+                predictions = predictor.predict_range(latitude, longitude, start, 7, lake_type)
+            logger.debug("Prédictions : %s", predictions)
+            result = {'success': True, 'predictions': predictions}
+            # Historique du réservoir étudié dans la même maille : n'influence pas les drapeaux
+            prior = cluster_priors.prior(latitude, longitude)
+            if prior is not None:
+                result['prior'] = prior
+            body = app.json.dumps(result) + "\n"
+            issued_at = predictor.forecast_issued_at(latitude, longitude, start, 7) or time.time()
+            cached = response_cache.put(key + (issued_at,), body, issued_at + FORECAST_TTL)
+
+        # GET : le navigateur réutilise la réponse pendant max-age puis revalide avec If-None-Match (304)
+        response = app.response_class(cached.body, mimetype=app.json.mimetype)
+        response.set_etag(cached.etag)
+        response.cache_control.private = True
+        if cached.max_age() > 0:
+            response.cache_control.max_age = cached.max_age()
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    except http_client.UpstreamError as e:
+        # Indisponibilité temporaire d'Open-Meteo : le client peut réessayer après Retry-After
+        logger.warning("Erreur app predict : %s", e)
+        response = jsonify({
+            'success': False,
+            'error': http_client.UNAVAILABLE_MESSAGE
         })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after or http_client.RESET_TIMEOUT)
+        return response
 
     except Exception as e:
-        print(f"Erreur app predict: {e}")
+        logger.error("Erreur app predict : %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
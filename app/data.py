@@ -1,11 +1,20 @@
 import json
 import os
+import sqlite3
+import threading
 from datetime import datetime
 
+from metrics import timed
+
 class DataManager:
     def __init__(self):
         self.users_file = "data/users.json"
         self.lakes_file = "data/lakes.json"
+        # Cache des fichiers lus : chemin -> (mtime_ns, taille, données)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         self._ensure_data_files()
 
     def _ensure_data_files(self):
@@ -22,24 +31,52 @@ class DataManager:
             with open(self.lakes_file, 'w') as f:
                 json.dump({}, f)
 
+    @timed("datamanager.read_json")
+    def _read_json(self, path):
+        """
+        Lit un fichier JSON en ne le re-parsant que si sa date de modification ou sa taille a changé
+        """
+        stat = os.stat(path)
+        with self._cache_lock:
+            cached = self._cache.get(path)
+            if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                self.cache_hits += 1
+                return cached[2]
+            self.cache_misses += 1
+
+        with open(path, 'r') as f:
+            data = json.load(f)
+        with self._cache_lock:
+            self._cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+        return data
+
+    @timed("datamanager.write_json")
+    def _write_json(self, path, data):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        stat = os.stat(path)
+        with self._cache_lock:
+            self._cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+
+    def cache_stats(self):
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+
+    # Les données retournées par load_* sont partagées avec le cache : ne pas les modifier en place
     def load_users(self):
-        with open(self.users_file, 'r') as f:
-            return json.load(f)
+        return self._read_json(self.users_file)
 
     def save_users(self, users):
-        with open(self.users_file, 'w') as f:
-            json.dump(users, f, indent=2)
+        self._write_json(self.users_file, users)
 
     def load_lakes(self):
-        with open(self.lakes_file, 'r') as f:
-            return json.load(f)
+        return self._read_json(self.lakes_file)
 
     def save_lakes(self, lakes):
-        with open(self.lakes_file, 'w') as f:
-            json.dump(lakes, f, indent=2)
+        self._write_json(self.lakes_file, lakes)
 
+    @timed("datamanager.register_user")
     def register_user(self, username, password):
-        users = self.load_users()
+        users = dict(self.load_users())
         if username in users:
             return False, "Nom d'utilisateur déjà pris"
         
@@ -50,33 +87,190 @@ class DataManager:
         self.save_users(users)
         return True, "Utilisateur créé avec succès"
 
+    @timed("datamanager.verify_user")
     def verify_user(self, username, password):
         users = self.load_users()
         if username not in users:
             return False
         return users[username]["password"] == password
 
+    @timed("datamanager.add_lake")
     def add_lake(self, username, lake_name, latitude, longitude, lake_type):
-        lakes = self.load_lakes()
-        if username not in lakes:
-            lakes[username] = []
+        lakes = dict(self.load_lakes())
+        user_lakes = lakes.get(username, [])
         
         # Vérifier si le lac existe déjà pour cet utilisateur
-        for lake in lakes[username]:
+        for lake in user_lakes:
             if lake["name"] == lake_name:
                 return False, "Un lac avec ce nom existe déjà"
         
-        lakes[username].append({
+        lakes[username] = user_lakes + [{
             "name": lake_name,
             "latitude": latitude,
             "longitude": longitude,
             "type": lake_type,
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        })
+        }]
         
         self.save_lakes(lakes)
         return True, "Lac ajouté avec succès"
 
+    @timed("datamanager.get_user_lakes")
     def get_user_lakes(self, username):
         lakes = self.load_lakes()
-        return lakes.get(username, [])
\ No newline at end of file
+        return lakes.get(username, [])
+
+    @timed("datamanager.get_all_lakes")
+    def get_all_lakes(self):
+        return [lake for user_lakes in self.load_lakes().values() for lake in user_lakes]
+
+class SQLiteDataManager:
+    """
+    Même interface que DataManager, stockée dans une base SQLite en mode WAL
+    Les écritures sont atomiques : plusieurs workers peuvent ajouter des lacs sans perdre d'écriture
+    """
+    def __init__(self, db_file="data/cyano.sqlite", users_file="data/users.json", lakes_file="data/lakes.json"):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._ensure_db()
+        self.migrate_from_json(users_file, lakes_file)
+
+    def _connect(self):
+        # Une connexion par thread, réutilisée entre les requêtes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _ensure_db(self):
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        conn = self._connect()
+        with conn:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    password TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lakes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    type TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_lakes_user_name ON lakes (username, name)")
+
+    def migrate_from_json(self, users_file, lakes_file):
+        """
+        Importe les fichiers JSON existants si la base est vide
+        """
+        conn = self._connect()
+        if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            return
+
+        users = {}
+        if os.path.exists(users_file):
+            with open(users_file, 'r') as f:
+                users = json.load(f)
+        lakes = {}
+        if os.path.exists(lakes_file):
+            with open(lakes_file, 'r') as f:
+                lakes = json.load(f)
+        self.save_users(users)
+        self.save_lakes(lakes)
+
+    def load_users(self):
+        rows = self._connect().execute("SELECT username, password, created_at FROM users").fetchall()
+        return {row["username"]: {"password": row["password"], "created_at": row["created_at"]} for row in rows}
+
+    def save_users(self, users):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                [(username, user["password"], user["created_at"]) for username, user in users.items()]
+            )
+
+    def load_lakes(self):
+        lakes = {}
+        for row in self._connect().execute("SELECT * FROM lakes ORDER BY id"):
+            lakes.setdefault(row["username"], []).append(self._lake(row))
+        return lakes
+
+    def save_lakes(self, lakes):
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO lakes (username, name, latitude, longitude, type, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(username, lake["name"], lake["latitude"], lake["longitude"], lake["type"], lake["created_at"])
+                 for username, user_lakes in lakes.items() for lake in user_lakes]
+            )
+
+    def _lake(self, row):
+        return {
+            "name": row["name"],
+            "latitude": row["latitude"],
+            "longitude": row["longitude"],
+            "type": row["type"],
+            "created_at": row["created_at"]
+        }
+
+    @timed("datamanager.register_user")
+    def register_user(self, username, password):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                    (username, password, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+        except sqlite3.IntegrityError:
+            return False, "Nom d'utilisateur déjà pris"
+        return True, "Utilisateur créé avec succès"
+
+    @timed("datamanager.verify_user")
+    def verify_user(self, username, password):
+        row = self._connect().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return False
+        return row["password"] == password
+
+    @timed("datamanager.add_lake")
+    def add_lake(self, username, lake_name, latitude, longitude, lake_type):
+        # L'index unique (username, name) refuse les doublons, même entre workers concurrents
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    """INSERT INTO lakes (username, name, latitude, longitude, type, created_at)
+                       VALUES (?, ?, ?, ?, ?, ?)""",
+                    (username, lake_name, latitude, longitude, lake_type,
+                     datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+        except sqlite3.IntegrityError:
+            return False, "Un lac avec ce nom existe déjà"
+        return True, "Lac ajouté avec succès"
+
+    @timed("datamanager.get_user_lakes")
+    def get_user_lakes(self, username):
+        rows = self._connect().execute("SELECT * FROM lakes WHERE username = ? ORDER BY id", (username,))
+        return [self._lake(row) for row in rows]
+
+    @timed("datamanager.get_all_lakes")
+    def get_all_lakes(self):
+        return [self._lake(row) for row in self._connect().execute("SELECT * FROM lakes ORDER BY id")]
+
+def create_data_manager():
+    """
+    Choisit le stockage selon la variable d'environnement CYANO_STORAGE ('sqlite' par défaut, ou 'json')
+    """
+    if os.environ.get("CYANO_STORAGE", "sqlite") == "json":
+        return DataManager()
+    return SQLiteDataManager()
@@ -0,0 +1,200 @@
+"""
+Carte régionale du risque : drapeaux de toutes les mailles de la grille Open-Meteo d'une zone
+
+La grille (GRID_RESOLUTION degrés) est découpée en tuiles de TILE_CELLS × TILE_CELLS mailles.
+Une tuile est calculée en entier (une requête multi-points pour toutes ses mailles absentes du cache)
+et mise en cache par (tuile, date de début, date d'émission des prévisions) pour les trois types de lac.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import http_client
+import predictor
+from risk import FLAGS, LAKE_TYPES, score_risk
+from weather_cache import FORECAST_TTL, GRID_RESOLUTION
+
+TILE_CELLS = 8
+# Zone maximale d'une requête /grid (25 tuiles de 0.8° de côté)
+MAX_TILES = 25
+DAYS = 7
+MAX_CACHED_TILES = 500
+# Les lacs ajoutés depuis moins de LAKE_INDEX_TTL secondes par un autre worker peuvent manquer sur la carte
+LAKE_INDEX_TTL = 60
+
+def cell_index(latitude, longitude, resolution=GRID_RESOLUTION):
+    """
+    Indices entiers (ligne, colonne) de la maille contenant un point (même arrondi que snap_to_grid)
+    """
+    return round(latitude / resolution), round(longitude / resolution)
+
+def cell_center(row, column, resolution=GRID_RESOLUTION):
+    return round(row * resolution, 4), round(column * resolution, 4)
+
+def tile_of(row, column):
+    return row // TILE_CELLS, column // TILE_CELLS
+
+def tiles_in_bbox(south, west, north, east):
+    """
+    Tuiles (ligne, colonne) couvrant la zone ; ValueError si elle est invalide ou trop grande
+    """
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        raise ValueError("Zone invalide : south <= north et west <= east attendus")
+    first = tile_of(*cell_index(south, west))
+    last = tile_of(*cell_index(north, east))
+    count = (last[0] - first[0] + 1) * (last[1] - first[1] + 1)
+    if count > MAX_TILES:
+        raise ValueError(f"Zone trop grande : {count} tuiles (maximum {MAX_TILES})")
+    return [(row, column) for row in range(first[0], last[0] + 1) for column in range(first[1], last[1] + 1)]
+
+def tile_cells(tile):
+    """
+    Centres des mailles d'une tuile, ligne par ligne du sud au nord, d'ouest en est
+    """
+    rows = range(tile[0] * TILE_CELLS, (tile[0] + 1) * TILE_CELLS)
+    columns = range(tile[1] * TILE_CELLS, (tile[1] + 1) * TILE_CELLS)
+    return [cell_center(row, column) for row in rows for column in columns]
+
+def score_tile(conditions_by_cell, cells):
+    """
+    Codes de drapeau des trois types de lac : tableau (types de lac, jours, mailles)
+    """
+    days = [list(conditions_by_cell[cell].values()) for cell in cells]
+
+    def column(name, default=None):
+        # Mêmes valeurs par défaut que predictor.score_days (soil_temp manquante ou nulle : NaN)
+        values = [[day[name] if default is None else day.get(name) or default for day in cell_days]
+                  for cell_days in days]
+        return np.array(values, dtype=float).T
+
+    return score_risk(column('temp'), column('humidity'), column('wind'), column('soil_temp', np.nan),
+                      column('weather_score', 0), np.arange(len(LAKE_TYPES))[:, np.newaxis, np.newaxis]).astype(np.int8)
+
+class Tile:
+    def __init__(self, tile, start, codes, issued_at):
+        self.tile = tile
+        self.start = start
+        self.codes = codes
+        self.issued_at = issued_at
+
+    def expired(self):
+        return time.time() - self.issued_at > FORECAST_TTL
+
+class TileCache:
+    """
+    Tuiles calculées par (tuile, date de début), éviction LRU au-delà de max_entries
+    Une tuile expire avec la plus ancienne des prévisions dont elle est issue
+    """
+    def __init__(self, max_entries=MAX_CACHED_TILES):
+        self.max_entries = max_entries
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = http_client.SingleFlight()
+
+    def get(self, tile, start):
+        with self._lock:
+            cached = self._tiles.get((tile, start))
+            if cached is None or cached.expired():
+                return None
+            self._tiles.move_to_end((tile, start))
+            return cached
+
+    def put(self, cached):
+        with self._lock:
+            self._tiles[(cached.tile, cached.start)] = cached
+            self._tiles.move_to_end((cached.tile, cached.start))
+            while len(self._tiles) > self.max_entries:
+                self._tiles.popitem(last=False)
+
+    def get_or_compute(self, tile, start):
+        cached = self.get(tile, start)
+        if cached is None:
+            # Requêtes simultanées sur la même tuile : un seul calcul
+            cached = self._flights.do((tile, start), lambda: self._compute(tile, start))
+        return cached
+
+    def _compute(self, tile, start):
+        cached = self.get(tile, start)
+        if cached is not None:
+            return cached
+        end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=DAYS - 1)).strftime("%Y-%m-%d")
+        dates = predictor.date_range(start, end)
+        cells = tile_cells(tile)
+        daily_by_cell = predictor.fetch_daily_many("forecast", cells, start, end)
+        conditions = {cell: predictor.daily_conditions(daily_by_cell[cell], dates) for cell in cells}
+        issued_at = predictor.get_weather_cache().fetched_at("forecast", cells, dates, predictor.HOURLY_VARIABLES)
+        cached = Tile(tile, start, score_tile(conditions, cells), issued_at or time.time())
+        self.put(cached)
+        return cached
+
+class LakeIndex:
+    """
+    Index spatial des lacs de chaque utilisateur : tuile -> lacs avec leur maille, reconstruit au plus
+    toutes les max_age secondes à partir de data_manager.get_user_lakes(username)
+    Un utilisateur ne voit sur la carte que ses propres lacs, comme sur /lakes
+    """
+    def __init__(self, data_manager, max_age=LAKE_INDEX_TTL):
+        self.data_manager = data_manager
+        self.max_age = max_age
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _build(self, username):
+        tiles = {}
+        for lake in self.data_manager.get_user_lakes(username):
+            row, column = cell_index(lake['latitude'], lake['longitude'])
+            tile = tile_of(row, column)
+            tiles.setdefault(tile, []).append({
+                'name': lake['name'],
+                'type': lake['type'],
+                'latitude': lake['latitude'],
+                'longitude': lake['longitude'],
+                'cell': (row - tile[0] * TILE_CELLS) * TILE_CELLS + column - tile[1] * TILE_CELLS
+            })
+        return tiles
+
+    def invalidate(self, username):
+        with self._lock:
+            self._indexes.pop(username, None)
+
+    def lakes_in(self, tile, username):
+        with self._lock:
+            built_at, tiles = self._indexes.get(username, (None, None))
+            if built_at is None or time.monotonic() - built_at > self.max_age:
+                tiles = self._build(username)
+                self._indexes[username] = (time.monotonic(), tiles)
+            return tiles.get(tile, [])
+
+def risk_grid(south, west, north, east, lake_type, tile_cache, lake_index, username, start=None):
+    """
+    Drapeaux de toutes les tuiles de la zone pour un type de lac, au format compact :
+    pour chaque tuile, un tableau par jour des codes des TILE_CELLS² mailles (index FLAGS),
+    ligne par ligne du sud au nord, et les lacs de l'utilisateur avec l'indice de leur maille
+    """
+    lake_code = LAKE_TYPES.index(lake_type)
+    start = start or datetime.now().strftime("%Y-%m-%d")
+    tiles = tiles_in_bbox(south, west, north, east)
+    # Tuiles calculées en parallèle sur le pool partagé (une requête multi-points chacune)
+    computed = http_client.map_concurrent(lambda tile: tile_cache.get_or_compute(tile, start), tiles)
+    end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=DAYS - 1)).strftime("%Y-%m-%d")
+    return {
+        'start': start,
+        'dates': predictor.date_range(start, end),
+        'flags': [str(flag) for flag in FLAGS],
+        'resolution': GRID_RESOLUTION,
+        'tile_cells': TILE_CELLS,
+        'tiles': [
+            {
+                'tile': list(tile.tile),
+                'origin': list(cell_center(tile.tile[0] * TILE_CELLS, tile.tile[1] * TILE_CELLS)),
+                'issued_at': math.floor(tile.issued_at),
+                'codes': tile.codes[lake_code].tolist(),
+                'lakes': lake_index.lakes_in(tile.tile, username)
+            }
+            for tile in computed
+        ]
+    }
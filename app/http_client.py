@@ -0,0 +1,311 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import register_collector
+
+# (connexion, lecture) en secondes : une réponse lente d'Open-Meteo ne bloque plus un worker indéfiniment
+TIMEOUT = (3.05, 10)
+POOL_SIZE = 16
+MAX_CONCURRENCY_PER_HOST = 4
+
+# Débit maximal vers un hôte (requêtes par seconde) et rafale autorisée
+RATE_PER_SECOND = 5
+BURST = 10
+# Nouvelles tentatives sur 429, 5xx et erreurs réseau, avec attente exponentielle aléatoire (full jitter)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+# Le circuit s'ouvre après FAILURE_THRESHOLD échecs consécutifs et reste ouvert RESET_TIMEOUT secondes
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Seul message transmis aux clients : URL, paramètres et erreurs réseau restent dans les logs
+UNAVAILABLE_MESSAGE = "Service météo indisponible"
+
+logger = logging.getLogger(__name__)
+
+# Session partagée : connexions keep-alive réutilisées entre les requêtes
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="http")
+
+class UpstreamError(Exception):
+    """
+    Open-Meteo indisponible ou réponse inutilisable (après les nouvelles tentatives)
+    """
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """
+    Limiteur de débit : rate jetons par seconde, au plus capacity jetons accumulés
+    """
+    def __init__(self, rate=RATE_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Fermé : les requêtes passent. Ouvert : elles sont refusées sans appel réseau pendant reset_timeout,
+    puis une seule requête d'essai est autorisée (semi-ouvert) et referme le circuit si elle réussit
+    """
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        # Thread qui effectue la requête d'essai en cours (semi-ouvert)
+        self._trial = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and self._trial is None:
+                self._trial = threading.get_ident()
+                return True
+            return False
+
+    def release(self):
+        """
+        Libère l'essai du thread courant s'il n'a été conclu ni par record_success ni par record_failure
+        (exception inattendue) : sinon le circuit resterait semi-ouvert et refuserait toutes les requêtes
+        """
+        with self._lock:
+            if self._trial == threading.get_ident():
+                self._trial = None
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return None
+        return max(0, int(self.reset_timeout - (time.monotonic() - self.opened_at)) + 1)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = None
+
+class _Host:
+    """
+    Limites et circuit partagés par toutes les requêtes vers un même hôte
+    """
+    def __init__(self):
+        self.concurrency = threading.BoundedSemaphore(MAX_CONCURRENCY_PER_HOST)
+        self.bucket = TokenBucket(RATE_PER_SECOND, BURST)
+        self.breaker = CircuitBreaker(FAILURE_THRESHOLD, RESET_TIMEOUT)
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+def _host(url):
+    host = urlparse(url).netloc
+    with _hosts_lock:
+        if host not in _hosts:
+            _hosts[host] = _Host()
+        return _hosts[host]
+
+# Compteurs par point d'accès (hôte + chemin)
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+def _record(url, **counts):
+    endpoint = urlparse(url).netloc + urlparse(url).path
+    with _metrics_lock:
+        entry = _metrics.setdefault(endpoint, {
+            'requests': 0, 'errors': 0, 'retries': 0, 'rejected': 0, 'latency_seconds': 0.0
+        })
+        for name, value in counts.items():
+            entry[name] += value
+
+def metrics():
+    """
+    Copie des compteurs par point d'accès et état des circuits par hôte
+    """
+    with _metrics_lock:
+        endpoints = {endpoint: dict(entry) for endpoint, entry in _metrics.items()}
+    with _hosts_lock:
+        circuits = {host: state.breaker.state for host, state in _hosts.items()}
+    return {'endpoints': endpoints, 'circuits': circuits}
+
+def _collect():
+    """
+    Compteurs de metrics() au format texte Prometheus
+    """
+    snapshot = metrics()
+    lines = []
+    for name, help in [('requests', "Requêtes envoyées"), ('errors', "Requêtes en échec"),
+                       ('retries', "Nouvelles tentatives"), ('rejected', "Requêtes refusées par le circuit"),
+                       ('latency_seconds', "Temps cumulé des requêtes")]:
+        lines += [f"# HELP cyano_upstream_{name}_total {help}", f"# TYPE cyano_upstream_{name}_total counter"]
+        lines += [f'cyano_upstream_{name}_total{{endpoint="{endpoint}"}} {entry[name]}'
+                  for endpoint, entry in sorted(snapshot['endpoints'].items())]
+    lines += ["# HELP cyano_upstream_circuit_open Circuit ouvert (1) ou fermé (0)",
+              "# TYPE cyano_upstream_circuit_open gauge"]
+    lines += [f'cyano_upstream_circuit_open{{host="{host}"}} {int(state != "closed")}'
+              for host, state in sorted(snapshot['circuits'].items())]
+    return lines
+
+register_collector(_collect)
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Attente avant la tentative attempt + 1 : aléatoire dans [0, BACKOFF_BASE * 2^attempt], plafonnée,
+    ou la valeur Retry-After envoyée par l'API si elle est plus longue
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, min(retry_after or 0, BACKOFF_MAX))
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+def get_json(url, params=None, timeout=TIMEOUT):
+    """
+    GET sur la session partagée, limité à MAX_CONCURRENCY_PER_HOST appels simultanés et
+    RATE_PER_SECOND requêtes par seconde par hôte, avec nouvelles tentatives et coupe-circuit
+    Lève UpstreamError si l'API reste indisponible ou renvoie une erreur
+    """
+    host = _host(url)
+    if not host.breaker.allow():
+        _record(url, rejected=1)
+        raise UpstreamError("Service météo indisponible (circuit ouvert)", retry_after=host.breaker.retry_after())
+
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            host.bucket.acquire()
+            started = time.perf_counter()
+            retry_after = None
+            try:
+                with host.concurrency:
+                    response = session.get(url, params=params, timeout=timeout)
+                error = None
+                if response.status_code in RETRY_STATUSES:
+                    error = UpstreamError(f"Service météo : HTTP {response.status_code}", response.status_code)
+                    retry_after = _retry_after(response)
+            except requests.RequestException as e:
+                response = None
+                logger.warning("Service météo injoignable : %s", e)
+                error = UpstreamError("Service météo injoignable")
+            _record(url, requests=1, latency_seconds=time.perf_counter() - started)
+
+            if error is None:
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = None
+                if response.status_code >= 400 or not isinstance(data, (dict, list)) or (
+                        isinstance(data, dict) and data.get("error")):
+                    # Requête refusée (paramètres invalides...) : inutile de réessayer
+                    host.breaker.record_success()
+                    _record(url, errors=1)
+                    reason = data.get("reason") if isinstance(data, dict) else None
+                    raise UpstreamError(f"Réponse météo invalide : {reason or response.status_code}",
+                                        response.status_code)
+                host.breaker.record_success()
+                return data
+
+            _record(url, errors=1)
+            host.breaker.record_failure()
+            if attempt == MAX_RETRIES or not host.breaker.allow():
+                error.retry_after = host.breaker.retry_after() or retry_after
+                raise error
+            _record(url, retries=1)
+            time.sleep(backoff_delay(attempt, retry_after))
+    finally:
+        # Essai interrompu par une exception inattendue : le circuit ne reste pas bloqué en semi-ouvert
+        host.breaker.release()
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents de même clé : un seul exécute fn, les autres attendent
+    et reçoivent le même résultat (ou la même exception)
+    """
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0  # appels servis par une requête déjà en cours
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+def map_concurrent(fn, items):
+    """
+    Applique fn à chaque élément en parallèle sur le pool partagé, résultats dans l'ordre
+    fn ne doit pas elle-même appeler map_concurrent
+    """
+    return list(_executor.map(fn, items))
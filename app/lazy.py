@@ -0,0 +1,57 @@
+"""
+Imports différés des modules lourds (numpy via predictor, requests via http_client)
+
+    predictor = lazy_import("predictor")
+
+Le module n'est importé qu'au premier accès à l'un de ses attributs : un worker qui démarre ou
+qui ne sert que /login, /register ou /metrics ne paie pas ces imports.
+CYANO_PRELOAD=1 importe tout immédiatement (serveur qui charge l'application avant de forker
+ses workers, par exemple gunicorn --preload).
+"""
+import importlib
+import os
+import threading
+
+PRELOAD = os.environ.get("CYANO_PRELOAD", "0") == "1"
+
+_proxies = {}
+_proxies_lock = threading.Lock()
+
+class LazyModule:
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    object.__setattr__(self, "_module", importlib.import_module(self._name))
+                module = self._module
+        return module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return f"<module {self._name!r} ({'chargé' if self.loaded else 'différé'})>"
+
+def lazy_import(name):
+    """
+    Module importé au premier accès (ou tout de suite avec CYANO_PRELOAD=1)
+    """
+    if PRELOAD:
+        return importlib.import_module(name)
+    with _proxies_lock:
+        if name not in _proxies:
+            _proxies[name] = LazyModule(name)
+        return _proxies[name]
@@ -1,200 +1,330 @@
-import requests
+import logging
+import os
 from datetime import datetime, timedelta
-import pandas as pd
 import numpy as np
+from metrics import span, timed
+from weather_cache import WeatherCache, snap_to_grid
+import http_client
+from rolling import pair_bounds, rolling_any, rolling_count, rolling_mean, rolling_sum, window_bounds
+from risk import FLAGS, LAKE_TYPES, describe, evaluate_conditions, score_risk
 
-def analyze_weather_variations(weather_data):
+logger = logging.getLogger(__name__)
+
+# Nom des séries utilisées dans les calculs -> variable horaire Open-Meteo
+HOURLY_COLUMNS = {
+    'temperature': 'temperature_2m',
+    'humidity': 'relative_humidity_2m',
+    'precipitation': 'precipitation',
+    'wind_speed': 'wind_speed_10m',
+    'soil_temp': 'soil_temperature_0_to_7cm',
+    'soil_moisture': 'soil_moisture_0_to_7cm'
+}
+VARIATION_COLUMNS = ['temperature', 'humidity', 'precipitation', 'wind_speed']
+
+def hourly_arrays(weather_data, columns=HOURLY_COLUMNS):
     """
-    Analyse les variations météorologiques sur la période
-    Retourne un score de variation et un descriptif des changements
+    Convertit une seule fois les séries horaires de la réponse en tableaux float contigus
+    Les valeurs manquantes (None) deviennent NaN
     """
-    df = pd.DataFrame({
-        'temperature': weather_data['hourly']['temperature_2m'],
-        'humidity': weather_data['hourly']['relative_humidity_2m'],
-        'precipitation': weather_data['hourly']['precipitation'],
-        'wind_speed': weather_data['hourly']['wind_speed_10m']
-    })
-    
+    hourly = weather_data['hourly']
+    return {name: np.array(hourly[HOURLY_COLUMNS[name]], dtype=float) for name in columns}
+
+def nan_mean(values):
+    """
+    Moyenne en ignorant les NaN (NaN si aucune valeur), comme pandas
+    """
+    missing = np.isnan(values)
+    count = values.size - np.count_nonzero(missing)
+    return np.where(missing, 0, values).sum() / count if count else np.nan
+
+def nan_std(values):
+    """
+    Écart-type échantillon (ddof=1) en ignorant les NaN, comme pandas
+    """
+    valid = values[~np.isnan(values)]
+    if valid.size < 2:
+        return np.nan
+    return np.sqrt(((valid - valid.mean()) ** 2).sum() / (valid.size - 1))
+
+def weather_variations(arrays):
+    """
+    Calcule les variations météo à partir des tableaux de hourly_arrays
+    """
+    temperature = arrays['temperature']
+    humidity = arrays['humidity']
+    wind_speed = arrays['wind_speed']
+    rainy = arrays['precipitation'] > 0.5  # Episodes de pluie > 0.5mm
+
     # Calculer les variations
     variations = {
-        'temp_variation': df['temperature'].std(),
-        'humidity_variation': df['humidity'].std(),
-        'wind_variation': df['wind_speed'].std(),
-        'rain_episodes': len(df[df['precipitation'] > 0.5])  # Episodes de pluie > 0.5mm
+        'temp_variation': nan_std(temperature),
+        'humidity_variation': nan_std(humidity),
+        'wind_variation': nan_std(wind_speed),
+        'rain_episodes': int(rainy.sum())
     }
     
     # Calculer le nombre de changements significatifs
-    significant_changes = 0
-    weather_changes = []
-    
-    # Variation significative de température (plus de 5 degrés)
-    temp_changes = df['temperature'].diff().abs() > 5
-    if temp_changes.any():
-        significant_changes += 1
-        weather_changes.append("variations importantes de température")
-    
-    # Alternance pluie/sec
-    rain_periods = (df['precipitation'] > 0.5).astype(int).diff().abs()
-    if rain_periods.sum() > 4:  # Plus de 2 alternances pluie/sec
-        significant_changes += 1
-        weather_changes.append("alternances pluie/sec")
-    
-    # Variation significative d'humidité (plus de 20%)
-    humidity_changes = df['humidity'].diff().abs() > 20
-    if humidity_changes.any():
-        significant_changes += 1
-        weather_changes.append("variations importantes d'humidité")
-    
-    # Variation significative de vent (plus de 10 km/h)
-    wind_changes = df['wind_speed'].diff().abs() > 10
-    if wind_changes.any():
-        significant_changes += 1
-        weather_changes.append("variations importantes de vent")
-    
-    weather_score = min(significant_changes, 3)  # Score plafonné à 3
-    variations['weather_score'] = weather_score
-    variations['weather_changes'] = len(weather_changes)
-    variations['weather_description'] = ", ".join(weather_changes) if weather_changes else "conditions stables"
+    # (une différence impliquant une valeur manquante est NaN et ne compte pas)
+    changes = [
+        # Variation significative de température (plus de 5 degrés)
+        (np.abs(np.diff(temperature)) > 5).any(),
+        # Alternance pluie/sec : plus de 2 alternances pluie/sec
+        np.count_nonzero(np.diff(rainy)) > 4,
+        # Variation significative d'humidité (plus de 20%)
+        (np.abs(np.diff(humidity)) > 20).any(),
+        # Variation significative de vent (plus de 10 km/h)
+        (np.abs(np.diff(wind_speed)) > 10).any()
+    ]
+    variations.update(summarize_changes(changes))
     
     return variations
 
+WEATHER_CHANGES = [
+    "variations importantes de température",
+    "alternances pluie/sec",
+    "variations importantes d'humidité",
+    "variations importantes de vent"
+]
+
+def summarize_changes(changes):
+    """
+    Score, nombre et description des changements détectés (booléens dans l'ordre de WEATHER_CHANGES)
+    """
+    weather_changes = [label for label, changed in zip(WEATHER_CHANGES, changes) if changed]
+    return {
+        'weather_score': min(len(weather_changes), 3),  # Score plafonné à 3
+        'weather_changes': len(weather_changes),
+        'weather_description': ", ".join(weather_changes) if weather_changes else "conditions stables"
+    }
+
+def rolling_changes(arrays, lower, upper):
+    """
+    Changements de weather_variations détectés sur chaque fenêtre [lower, upper)
+    Retourne un tableau de booléens (fenêtres × WEATHER_CHANGES) à passer à summarize_changes
+    """
+    diff_lower, diff_upper = pair_bounds(lower, upper)
+    rainy = arrays['precipitation'] > 0.5
+    return np.column_stack([
+        rolling_any(np.abs(np.diff(arrays['temperature'])) > 5, diff_lower, diff_upper),
+        rolling_count(np.diff(rainy), diff_lower, diff_upper) > 4,
+        rolling_any(np.abs(np.diff(arrays['humidity'])) > 20, diff_lower, diff_upper),
+        rolling_any(np.abs(np.diff(arrays['wind_speed'])) > 10, diff_lower, diff_upper)
+    ])
+
+def analyze_weather_variations(weather_data):
+    """
+    Analyse les variations météorologiques sur la période
+    Retourne un score de variation et un descriptif des changements
+    """
+    return weather_variations(hourly_arrays(weather_data, VARIATION_COLUMNS))
+
+@timed("evaluate_risk_level")
 def evaluate_risk_level(conditions, lake_type):
     """
     Ajuste les seuils de risque selon le type de lac et les variations météo
     Types: 'forest', 'agriculture', 'urban'
     """
-    risk_score = 0
-    high_risk = 0
-    
-    # Ajustement des seuils selon le type de lac
-    temp_threshold = {
-        'forest': {'base': 23, 'high': 25},
-        'agriculture': {'base': 24, 'high': 26},
-        'urban': {'base': 25, 'high': 27}
-    }[lake_type]
-    
-    # Seuils fixes sans stratification
-    humidity_threshold = {'base': 65, 'high': 75}
-    wind_threshold = {'base': 10, 'high': 7}
-
-    # Température
-    if conditions['temp'] >= temp_threshold['base']:
-        risk_score += 1
-        if conditions['temp'] >= temp_threshold['high']:
-            high_risk += 1
-            
-    # Humidité
-    if conditions['humidity'] > humidity_threshold['base']:
-        risk_score += 1
-        if conditions['humidity'] > humidity_threshold['high']:
-            high_risk += 1
-    
-    # Vent
-    if conditions['wind'] < wind_threshold['base']:
-        risk_score += 1
-        if conditions['wind'] < wind_threshold['high']:
-            high_risk += 1
-            
-    # Sol
-    if conditions.get('soil_temp'):
-        if conditions['soil_temp'] > 24:
-            risk_score += 1
-            if conditions['soil_temp'] > 26:
-                high_risk += 1
-
-    # Score des variations météo
-    if 'weather_score' in conditions:
-        risk_score += conditions['weather_score'] * 0.5  # Ajoute 0.5 point par niveau de variation
-        if conditions['weather_score'] >= 2:
-            high_risk += 1
-
-    # Messages personnalisés selon les conditions
-    weather_message = ""
-    if 'weather_description' in conditions and conditions['weather_description'] != "conditions stables":
-        weather_message = f" - Instabilité météo : {conditions['weather_description']}"
-
-    # Just get  weather_description, weather_score, wind, temp, humidity, precip
-    conditions = {k: v for k, v in conditions.items() if k in ['weather_description', 'wind', 'temp', 'humidity', 'precip']}
-    # Drapeaux
-    if risk_score <= 1.5:  # Seuil ajusté pour tenir compte des variations
-        return "VERT", f"Risque faible{weather_message}", conditions
-    elif risk_score <= 2.5 or high_risk == 0:
-        return "ORANGE", f"Conditions favorables - Surveillance recommandée{weather_message}", conditions
-    else:
-        return "ROUGE", f"Conditions très favorables - Présence probable{weather_message}", conditions
+    return evaluate_conditions(conditions, lake_type)
+
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "wind_speed_10m",
+    "soil_temperature_0_to_7cm",
+    "soil_moisture_0_to_7cm"
+]
+
+# Remplaçables (serveur local des benchmarks, miroir Open-Meteo) par variables d'environnement
+BASE_URLS = {
+    "forecast": os.environ.get("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast"),
+    "archive": os.environ.get("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
+}
+
+# Points par requête multi-points (longueur de l'URL)
+MAX_LOCATIONS_PER_REQUEST = 100
+
+_weather_cache = None
+_upstream_flights = http_client.SingleFlight()
+
+def get_weather_cache():
+    """
+    Cache météo par défaut (data/weather_cache.sqlite), créé au premier appel
+    """
+    global _weather_cache
+    if _weather_cache is None:
+        _weather_cache = WeatherCache()
+    return _weather_cache
+
+def date_range(start_date, end_date):
+    """
+    Liste des dates YYYY-MM-DD de start_date à end_date (inclus)
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d")
+    return [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((end - start).days + 1)]
+
+def split_by_day(weather_data):
+    """
+    Découpe une réponse horaire multi-jours en {date: données horaires du jour}
+    """
+    hourly = weather_data['hourly']
+    days = {}
+    for i, timestamp in enumerate(hourly['time']):
+        days.setdefault(timestamp[:10], []).append(i)
+
+    return {
+        date: {'hourly': {key: values[indices[0]:indices[-1] + 1] for key, values in hourly.items()}}
+        for date, indices in days.items()
+    }
+
+def merge_days(days):
+    """
+    Recolle des données horaires journalières en une seule réponse
+    """
+    hourly = {}
+    for day in days:
+        for key, values in day['hourly'].items():
+            hourly.setdefault(key, []).extend(values)
+    return {'hourly': hourly}
+
+def fetch_daily(source, latitude, longitude, start_date, end_date, cache=None, refresh=False):
+    """
+    Récupère les données horaires d'une période découpées par jour, en passant par le cache local
+    Seule la plage de jours absente du cache est demandée à Open-Meteo
+    refresh : redemande toute la période à Open-Meteo même si le cache est encore valide
+    """
+    weather_cache = cache or get_weather_cache()
+    latitude, longitude = snap_to_grid(latitude, longitude)
+    dates = date_range(start_date, end_date)
+    daily_data = {}
+    if not refresh:
+        with span("weather_cache_read"):
+            daily_data = weather_cache.get_days(source, latitude, longitude, dates, HOURLY_VARIABLES)
+
+    missing = [date for date in dates if date not in daily_data]
+    if missing:
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": missing[0],
+            "end_date": missing[-1],
+            "hourly": HOURLY_VARIABLES
+        }
+
+        def fetch():
+            weather_data = http_client.get_json(BASE_URLS[source], params)
+            if not isinstance(weather_data, dict) or 'hourly' not in weather_data:
+                raise http_client.UpstreamError("Réponse météo sans données horaires")
+            fetched = split_by_day(weather_data)
+            weather_cache.put_days(source, latitude, longitude, fetched, HOURLY_VARIABLES)
+            return fetched
+
+        # Les requêtes simultanées pour la même maille et la même période partagent un seul appel
+        key = (source, latitude, longitude, missing[0], missing[-1], tuple(HOURLY_VARIABLES))
+        try:
+            with span("upstream_fetch"):
+                daily_data.update(_upstream_flights.do(key, fetch))
+        except http_client.UpstreamError as e:
+            logger.warning("Open-Meteo indisponible (%s), lecture des prévisions expirées", e)
+            # Open-Meteo indisponible : prévisions expirées du cache si elles couvrent la période
+            stale = weather_cache.get_days(source, latitude, longitude, missing, HOURLY_VARIABLES, allow_stale=True)
+            if len(stale) < len(missing):
+                raise
+            daily_data.update(stale)
+
+    return {date: daily_data[date] for date in dates if date in daily_data}
+
+def fetch_daily_many(source, cells, start_date, end_date, cache=None):
+    """
+    fetch_daily pour plusieurs mailles (centres de la grille) : {maille: {date: données horaires}}
+    Les mailles absentes du cache sont demandées ensemble, MAX_LOCATIONS_PER_REQUEST par appel
+    (requête multi-points d'Open-Meteo : latitudes et longitudes séparées par des virgules)
+    """
+    weather_cache = cache or get_weather_cache()
+    dates = date_range(start_date, end_date)
+    results = {}
+    with span("weather_cache_read"):
+        for cell in cells:
+            results[cell] = weather_cache.get_days(source, cell[0], cell[1], dates, HOURLY_VARIABLES)
+    missing = [cell for cell in cells if len(results[cell]) < len(dates)]
+
+    for i in range(0, len(missing), MAX_LOCATIONS_PER_REQUEST):
+        batch = missing[i:i + MAX_LOCATIONS_PER_REQUEST]
+        params = {
+            "latitude": ",".join(str(cell[0]) for cell in batch),
+            "longitude": ",".join(str(cell[1]) for cell in batch),
+            "start_date": start_date,
+            "end_date": end_date,
+            "hourly": HOURLY_VARIABLES
+        }
+        try:
+            with span("upstream_fetch"):
+                locations = http_client.get_json(BASE_URLS[source], params)
+            # Un seul point : Open-Meteo renvoie un objet au lieu d'une liste
+            locations = locations if isinstance(locations, list) else [locations]
+            if len(locations) != len(batch) or any('hourly' not in location for location in locations):
+                raise http_client.UpstreamError("Réponse météo multi-points incomplète")
+        except http_client.UpstreamError as e:
+            logger.warning("Open-Meteo indisponible (%s), lecture des prévisions expirées", e)
+            for cell in batch:
+                stale = weather_cache.get_days(source, cell[0], cell[1], dates, HOURLY_VARIABLES, allow_stale=True)
+                if len(stale) < len(dates):
+                    raise
+                results[cell] = stale
+            continue
+
+        fetched = {cell: split_by_day(location) for cell, location in zip(batch, locations)}
+        weather_cache.put_cells(source, fetched, HOURLY_VARIABLES)
+        results.update(fetched)
+
+    return {cell: {date: days[date] for date in dates if date in days} for cell, days in results.items()}
+
+def fetch_hourly(source, latitude, longitude, start_date, end_date):
+    """
+    Récupère les données horaires d'une période en une seule réponse
+    """
+    return merge_days(fetch_daily(source, latitude, longitude, start_date, end_date).values())
+
+def get_forecast_range(latitude, longitude, start_date, end_date):
+    """
+    Récupère les prévisions horaires de start_date à end_date (inclus) en un seul appel
+    """
+    return fetch_hourly("forecast", latitude, longitude, start_date, end_date)
 
 def get_forecast_data(latitude, longitude, date):
     """
     Récupère les données de prévision météo pour les dates futures
     """
-    base_url = "https://api.open-meteo.com/v1/forecast"
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "start_date": date,
-        "end_date": date,
-        "hourly": [
-            "temperature_2m",
-            "relative_humidity_2m",
-            "precipitation",
-            "wind_speed_10m",
-            "soil_temperature_0_to_7cm",
-            "soil_moisture_0_to_7cm"
-        ]
-    }
-    
-    response = requests.get(base_url, params=params)
-    return response.json()
+    return get_forecast_range(latitude, longitude, date, date)
 
 def get_historical_data(latitude, longitude, date):
     """
     Récupère les données météo historiques
     """
-    base_url = "https://archive-api.open-meteo.com/v1/archive"
     end_date = datetime.strptime(date, "%Y-%m-%d")
     start_date = end_date - timedelta(days=7)
-    
-    params = {
-        "latitude": latitude,
-        "longitude": longitude,
-        "start_date": start_date.strftime("%Y-%m-%d"),
-        "end_date": end_date.strftime("%Y-%m-%d"),
-        "hourly": [
-            "temperature_2m",
-            "relative_humidity_2m",
-            "precipitation",
-            "wind_speed_10m",
-            "soil_temperature_0_to_7cm",
-            "soil_moisture_0_to_7cm"
-        ]
-    }
-    
-    response = requests.get(base_url, params=params)
-    return response.json()
+    return fetch_hourly("archive", latitude, longitude, start_date.strftime("%Y-%m-%d"), date)
 
 def get_conditions(weather_data):
     """
     Calcule les conditions moyennes sur la période
+    Les séries sont lues une seule fois, moyennes et variations sont calculées sur les mêmes tableaux
     """
-    df = pd.DataFrame({
-        'temperature': weather_data['hourly']['temperature_2m'],
-        'humidity': weather_data['hourly']['relative_humidity_2m'],
-        'precipitation': weather_data['hourly']['precipitation'],
-        'wind_speed': weather_data['hourly']['wind_speed_10m'],
-        'soil_temp': weather_data['hourly']['soil_temperature_0_to_7cm'],
-        'soil_moisture': weather_data['hourly']['soil_moisture_0_to_7cm']
-    })
+    with span("build_arrays"):
+        arrays = hourly_arrays(weather_data)
     
     # Analyser les variations météo
-    variations = analyze_weather_variations(weather_data)
+    with span("analyze_weather_variations"):
+        variations = weather_variations(arrays)
     
     conditions = {
-        'temp': round(df['temperature'].mean(), 1),
-        'humidity': round(df['humidity'].mean(), 1),
-        'wind': round(df['wind_speed'].mean(), 1),
-        'soil_temp': round(df['soil_temp'].mean(), 1),
-        'precip': round(df['precipitation'].sum(), 1),
-        'soil_moisture': round(df['soil_moisture'].mean(), 1),
+        'temp': round(nan_mean(arrays['temperature']), 1),
+        'humidity': round(nan_mean(arrays['humidity']), 1),
+        'wind': round(nan_mean(arrays['wind_speed']), 1),
+        'soil_temp': round(nan_mean(arrays['soil_temp']), 1),
+        'precip': round(np.nansum(arrays['precipitation']), 1),
+        'soil_moisture': round(nan_mean(arrays['soil_moisture']), 1),
         'weather_score': variations['weather_score'],
         'weather_changes': variations['weather_changes'],
         'weather_description': variations['weather_description']
@@ -202,6 +332,57 @@ def get_conditions(weather_data):
     
     return conditions
 
+def rolling_means(weather_data, dates, window_days=7, columns=HOURLY_COLUMNS):
+    """
+    Moyennes (cumul pour les précipitations) de chaque fenêtre [date - window_days, date]
+    calculées en un seul passage sur la série horaire : {nom: tableau aligné sur dates}
+    """
+    lower, upper = window_bounds(weather_data['hourly']['time'], dates, window_days)
+    arrays = hourly_arrays(weather_data, columns)
+    return {
+        name: (rolling_sum if name == 'precipitation' else rolling_mean)(values, lower, upper)
+        for name, values in arrays.items()
+    }
+
+def settle_ties(results, values, lower, upper, reduce):
+    """
+    Recalcule directement les fenêtres dont le résultat tombe à la limite d'un arrondi à 0.1 :
+    l'erreur des sommes cumulées (~1e-12) ne doit pas changer l'arrondi par rapport à get_conditions
+    """
+    tenths = np.abs(results) * 10
+    for i in np.flatnonzero(np.abs(tenths - np.floor(tenths) - 0.5) < 1e-6):
+        results[i] = reduce(values[lower[i]:upper[i]])
+    return results
+
+@timed("rolling_conditions")
+def conditions_series(weather_data, dates, window_days=7):
+    """
+    Équivalent de get_conditions sur la fenêtre [date - window_days, date] de chaque date,
+    calculé en un seul passage sur la série horaire complète
+    """
+    lower, upper = window_bounds(weather_data['hourly']['time'], dates, window_days)
+    arrays = hourly_arrays(weather_data)
+    means = {
+        name: settle_ties(rolling_mean(values, lower, upper), values, lower, upper, nan_mean)
+        for name, values in arrays.items()
+    }
+    precip = settle_ties(rolling_sum(arrays['precipitation'], lower, upper),
+                         arrays['precipitation'], lower, upper, np.nansum)
+    changes = rolling_changes(arrays, lower, upper)
+
+    return {
+        date: {
+            'temp': round(means['temperature'][i], 1),
+            'humidity': round(means['humidity'][i], 1),
+            'wind': round(means['wind_speed'][i], 1),
+            'soil_temp': round(means['soil_temp'][i], 1),
+            'precip': round(precip[i], 1),
+            'soil_moisture': round(means['soil_moisture'][i], 1),
+            **summarize_changes(changes[i])
+        }
+        for i, date in enumerate(dates)
+    }
+
 def predict_for_date(latitude, longitude, date, lake_type):
     try:
         # Vérifier si la date est dans le futur
@@ -216,5 +397,97 @@ def predict_for_date(latitude, longitude, date, lake_type):
         conditions = get_conditions(weather_data)
         return evaluate_risk_level(conditions, lake_type)
     except Exception as e:
-        print(f"Erreur : {e}")
-        raise e
\ No newline at end of file
+        logger.error("Erreur : %s", e)
+        raise e
+
+def daily_conditions(daily_data, dates):
+    """
+    Calcule les conditions de chaque date à partir des données horaires découpées par jour
+    """
+    conditions = {}
+    for date in dates:
+        if date not in daily_data:
+            raise ValueError(f"Pas de données météo pour le {date}")
+        conditions[date] = get_conditions(daily_data[date])
+    return conditions
+
+@timed("evaluate_risk_level")
+def score_days(conditions_by_date, lake_type):
+    """
+    Évalue le risque de tous les jours en un seul appel vectorisé pour un type de lac
+    """
+    days = list(conditions_by_date.values())
+    codes = score_risk(
+        [conditions['temp'] for conditions in days],
+        [conditions['humidity'] for conditions in days],
+        [conditions['wind'] for conditions in days],
+        [conditions.get('soil_temp') or np.nan for conditions in days],
+        [conditions.get('weather_score', 0) for conditions in days],
+        LAKE_TYPES.index(lake_type)
+    )
+
+    predictions = []
+    for date, conditions, flag in zip(conditions_by_date, days, FLAGS[codes]):
+        flag = str(flag)
+        message, conditions = describe(flag, conditions)
+        predictions.append({
+            'date': date,
+            'flag': flag,
+            'message': message,
+            'conditions': conditions
+        })
+    return predictions
+
+def predict_range(latitude, longitude, start, days, lake_type):
+    """
+    Prédit le risque pour `days` jours consécutifs à partir de `start` (YYYY-MM-DD)
+    La fenêtre complète est récupérée en un seul appel puis découpée jour par jour
+    """
+    end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    daily_data = fetch_daily("forecast", latitude, longitude, start, end)
+    return score_days(daily_conditions(daily_data, date_range(start, end)), lake_type)
+
+def forecast_issued_at(latitude, longitude, start, days):
+    """
+    Date de récupération auprès d'Open-Meteo des prévisions utilisées par predict_range
+    (timestamp), None si elles ne sont pas encore en cache
+    """
+    end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    return get_weather_cache().fetched_at("forecast", [snap_to_grid(latitude, longitude)], date_range(start, end),
+                                          HOURLY_VARIABLES)
+
+def predict_lakes(lakes, start, days):
+    """
+    Prédit le risque sur `days` jours pour une liste de lacs (dicts name/latitude/longitude/type)
+    Les lacs d'une même maille partagent un seul appel météo, les mailles sont récupérées en parallèle
+    Retourne, dans l'ordre des lacs, le lac complété de 'predictions' ou de 'error'
+    """
+    end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    dates = date_range(start, end)
+    lake_cells = [snap_to_grid(lake['latitude'], lake['longitude']) for lake in lakes]
+    cells = list(dict.fromkeys(lake_cells))
+
+    def cell_conditions(cell):
+        try:
+            return daily_conditions(fetch_daily("forecast", cell[0], cell[1], start, end), dates)
+        except Exception as e:
+            return e
+
+    conditions_by_cell = dict(zip(cells, http_client.map_concurrent(cell_conditions, cells)))
+
+    results = []
+    for lake, cell in zip(lakes, lake_cells):
+        conditions = conditions_by_cell[cell]
+        if isinstance(conditions, http_client.UpstreamError):
+            logger.warning("Erreur prédiction %s : %s", lake['name'], conditions)
+            results.append({**lake, 'error': http_client.UNAVAILABLE_MESSAGE})
+            continue
+        if isinstance(conditions, Exception):
+            results.append({**lake, 'error': str(conditions)})
+            continue
+        try:
+            results.append({**lake, 'predictions': score_days(conditions, lake['type'])})
+        except ValueError:
+            # Type de lac inconnu (add_lake accepte toute valeur) : seul ce lac est en erreur
+            results.append({**lake, 'error': f"Type de lac inconnu : {lake['type']}"})
+    return results
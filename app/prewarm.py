@@ -0,0 +1,170 @@
+"""
+Pré-calcul en arrière-plan des prévisions sur 7 jours de tous les lacs enregistrés
+
+Chaque maille de la grille météo contenant au moins un lac est rafraîchie toutes les INTERVAL secondes :
+les prévisions récupérées depuis plus de INTERVAL secondes sont redemandées à Open-Meteo (pour suivre
+les mises à jour du modèle), puis les drapeaux des trois types de lac sont stockés dans un ResultStore
+que /predict et /lakes/risk consultent avant de calculer à la demande.
+
+Chaque worker a son propre thread, son ResultStore et son RateBudget ; le cache météo SQLite est partagé,
+donc une maille rafraîchie par un worker n'est pas redemandée par les autres pendant INTERVAL secondes.
+
+Configuration par variables d'environnement :
+    CYANO_PREWARM=0                  désactive le pré-calcul
+    CYANO_PREWARM_INTERVAL=3600      secondes entre deux passages
+    CYANO_PREWARM_DELAY=60           secondes avant le premier passage (numpy et requests ne sont
+                                     importés qu'à ce moment, ou à la première prédiction demandée)
+    CYANO_PREWARM_CONCURRENCY=2      mailles rafraîchies en parallèle
+    CYANO_PREWARM_RATE=30            mailles rafraîchies par minute au maximum
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from lazy import lazy_import
+from metrics import span
+from weather_cache import FORECAST_TTL, snap_to_grid
+
+INTERVAL = int(os.environ.get("CYANO_PREWARM_INTERVAL", 3600))
+DELAY = int(os.environ.get("CYANO_PREWARM_DELAY", 60))
+# Moins que MAX_CONCURRENCY_PER_HOST : les requêtes interactives gardent des connexions libres
+CONCURRENCY = int(os.environ.get("CYANO_PREWARM_CONCURRENCY", 2))
+RATE_PER_MINUTE = float(os.environ.get("CYANO_PREWARM_RATE", 30))
+DAYS = 7
+
+logger = logging.getLogger(__name__)
+
+predictor = lazy_import("predictor")
+
+class ResultStore:
+    """
+    Prédictions pré-calculées par (maille, date de début, nombre de jours), pour chaque type de lac
+    Un résultat est ignoré max_age secondes après la récupération des prévisions dont il est issu
+    (même fraîcheur que le cache des prévisions) et supprimé au put suivant, comme ceux des jours précédents
+    """
+    def __init__(self, max_age=FORECAST_TTL):
+        self.max_age = max_age
+        self._results = {}
+        self._start = None
+        self._swept_at = 0.0
+        self._lock = threading.Lock()
+
+    def put(self, cell, start, days, predictions_by_type, issued_at):
+        """
+        issued_at : date de récupération des prévisions (WeatherCache.fetched_at)
+        """
+        now = time.time()
+        with self._lock:
+            # Résultats d'une autre date de début ou expirés : supprimés (une entrée par maille au plus),
+            # au changement de jour ou au plus une fois par minute
+            if start != self._start or now - self._swept_at > 60:
+                for key in [key for key, entry in self._results.items()
+                            if key[1] != start or now - entry[0] > self.max_age]:
+                    del self._results[key]
+                self._start, self._swept_at = start, now
+            self._results[(cell, start, days)] = (issued_at, predictions_by_type)
+
+    def get(self, latitude, longitude, start, days, lake_type):
+        """
+        (prédictions, date de récupération des prévisions dont elles sont issues), None si absentes ou expirées
+        """
+        with self._lock:
+            entry = self._results.get((snap_to_grid(latitude, longitude), start, days))
+        if entry is None or time.time() - entry[0] > self.max_age or lake_type not in entry[1]:
+            return None
+        return entry[1][lake_type], entry[0]
+
+class RateBudget:
+    """
+    Espace les départs d'au moins 60 / per_minute secondes, quel que soit le nombre de threads
+    """
+    def __init__(self, per_minute):
+        self.spacing = 60.0 / per_minute if per_minute > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, stop_event):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.spacing
+        # Retourne False si l'arrêt est demandé pendant l'attente
+        return not stop_event.wait(start - now) if start > now else not stop_event.is_set()
+
+class Prewarmer:
+    def __init__(self, data_manager, store, interval=INTERVAL, concurrency=CONCURRENCY,
+                 rate_per_minute=RATE_PER_MINUTE, days=DAYS, delay=DELAY):
+        self.data_manager = data_manager
+        self.store = store
+        self.interval = interval
+        self.delay = delay
+        self.concurrency = concurrency
+        self.budget = RateBudget(rate_per_minute)
+        self.days = days
+        self._stop = threading.Event()
+        self._thread = None
+
+    def cells(self):
+        """
+        Mailles distinctes contenant au moins un lac enregistré
+        """
+        lakes = self.data_manager.get_all_lakes()
+        return list(dict.fromkeys(snap_to_grid(lake['latitude'], lake['longitude']) for lake in lakes))
+
+    def refresh_cell(self, cell, start):
+        if not self.budget.wait(self._stop):
+            return False
+        end = (datetime.strptime(start, "%Y-%m-%d") + timedelta(days=self.days - 1)).strftime("%Y-%m-%d")
+        # Prévisions récupérées pendant ce passage (par ce worker ou un autre) : pas de nouvel appel
+        issued_at = predictor.forecast_issued_at(cell[0], cell[1], start, self.days)
+        refresh = issued_at is None or time.time() - issued_at >= self.interval
+        daily_data = predictor.fetch_daily("forecast", cell[0], cell[1], start, end, refresh=refresh)
+        conditions = predictor.daily_conditions(daily_data, predictor.date_range(start, end))
+        self.store.put(cell, start, self.days, {
+            lake_type: predictor.score_days(conditions, lake_type) for lake_type in predictor.LAKE_TYPES
+        }, predictor.forecast_issued_at(cell[0], cell[1], start, self.days) or time.time())
+        return True
+
+    def run_once(self):
+        """
+        Rafraîchit toutes les mailles ; retourne le nombre de mailles rafraîchies et en erreur
+        """
+        start = datetime.now().strftime("%Y-%m-%d")
+
+        def refresh(cell):
+            try:
+                return self.refresh_cell(cell, start)
+            except Exception as e:
+                logger.warning("Erreur prewarm %s : %s", cell, e)
+                return None
+
+        with span("prewarm"), ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="prewarm") as executor:
+            results = list(executor.map(refresh, self.cells()))
+        summary = {'refreshed': results.count(True), 'errors': results.count(None)}
+        logger.info("Pré-calcul : %(refreshed)d mailles rafraîchies, %(errors)d en erreur", summary)
+        return summary
+
+    def _run(self):
+        # Premier passage différé : le worker démarre et sert ses premières requêtes sans numpy ni requests
+        if self._stop.wait(self.delay):
+            return
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("Erreur prewarm : %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
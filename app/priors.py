@@ -0,0 +1,63 @@
+"""
+Profil historique de toxicité des réservoirs étudiés, calculé hors ligne par analyse/clusters.py
+
+Pour des coordonnées situées dans la même maille météo qu'un réservoir regroupé, prior() retourne
+son groupe et les fréquences ORANGE/ROUGE observées dans ce groupe. Le fichier n'est relu que s'il
+a changé (CYANO_CLUSTERS_FILE pour un autre emplacement).
+"""
+import json
+import logging
+import os
+import threading
+
+from weather_cache import snap_to_grid
+
+CLUSTERS_FILE = os.environ.get(
+    "CYANO_CLUSTERS_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'analyse', 'cache', 'lake_clusters.json')
+)
+
+logger = logging.getLogger(__name__)
+
+class ClusterPriors:
+    def __init__(self, path=CLUSTERS_FILE):
+        self.path = path
+        self._mtime = None
+        self._by_cell = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._mtime, self._by_cell = None, {}
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Groupes de lacs illisibles (%s) : %s", self.path, e)
+            return
+
+        by_cell = {}
+        for lake, entry in data['lakes'].items():
+            if 'latitude' not in entry:
+                continue
+            summary = data['clusters'][str(entry['cluster'])]
+            by_cell[snap_to_grid(entry['latitude'], entry['longitude'])] = {
+                'reservoir': lake,
+                'cluster': entry['cluster'],
+                'orange_rate': summary['orange_rate'],
+                'rouge_rate': summary['rouge_rate']
+            }
+        self._mtime, self._by_cell = mtime, by_cell
+
+    def prior(self, latitude, longitude):
+        """
+        Groupe du réservoir étudié dans la maille de (latitude, longitude), None s'il n'y en a pas
+        """
+        with self._lock:
+            self._load()
+            return self._by_cell.get(snap_to_grid(latitude, longitude))
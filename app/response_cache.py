@@ -0,0 +1,56 @@
+"""
+Cache des réponses JSON de /predict
+
+Une entrée est indexée par (maille, type de lac, date de début, date d'émission de la prévision) :
+une nouvelle récupération des prévisions change la clé, l'entrée précédente n'est plus lue.
+Elle expire avec les prévisions dont elle est issue (FORECAST_TTL après leur récupération).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = 2000
+
+class CachedResponse:
+    def __init__(self, body, expires):
+        self.body = body
+        self.expires = expires
+        self.etag = hashlib.sha1(body.encode()).hexdigest()[:20]
+
+    def max_age(self):
+        """
+        Secondes de validité restantes (0 si expirée)
+        """
+        return max(0, int(self.expires - time.time()))
+
+class ResponseCache:
+    """
+    Corps de réponse et ETag par clé, éviction LRU au-delà de max_entries
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.max_age() <= 0:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, expires):
+        entry = CachedResponse(body, expires)
+        if entry.max_age() <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
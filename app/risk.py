@@ -0,0 +1,93 @@
+import numpy as np
+
+FLAGS = np.array(["VERT", "ORANGE", "ROUGE"])
+LAKE_TYPES = ["forest", "agriculture", "urban"]
+
+MESSAGES = {
+    "VERT": "Risque faible",
+    "ORANGE": "Conditions favorables - Surveillance recommandée",
+    "ROUGE": "Conditions très favorables - Présence probable"
+}
+
+# Seuils (base, high) : le seuil "high" n'est compté que si le seuil "base" est atteint
+DEFAULT_THRESHOLDS = {
+    'temp': {
+        'forest': (23, 25),
+        'agriculture': (24, 26),
+        'urban': (25, 27)
+    },
+    'humidity': (65, 75),
+    'wind': (10, 7),
+    'soil_temp': (24, 26),
+    # Score maximal pour VERT, puis pour ORANGE (au-delà : ROUGE si au moins un seuil "high")
+    'cuts': (1.5, 2.5)
+}
+
+def score_risk(temp, humidity, wind, soil_temp=None, weather_score=None, lake_type=0,
+               thresholds=DEFAULT_THRESHOLDS):
+    """
+    Évalue le risque sur des tableaux de conditions (par exemple N lacs × M jours)
+    Les entrées sont diffusées (broadcast) entre elles, lake_type contient des codes de LAKE_TYPES
+    Les seuils peuvent aussi être des tableaux diffusés avec les conditions (par exemple C × 1 pour
+    C configurations évaluées en un seul calcul, voir analyse/calibrate.py)
+    Retourne un tableau de codes de drapeau : 0 VERT, 1 ORANGE, 2 ROUGE
+    """
+    temp = np.asarray(temp, dtype=float)
+    humidity = np.asarray(humidity, dtype=float)
+    wind = np.asarray(wind, dtype=float)
+    soil_temp = np.asarray(np.nan if soil_temp is None else soil_temp, dtype=float)
+    weather_score = np.asarray(0 if weather_score is None else weather_score, dtype=float)
+
+    lake_type = np.asarray(lake_type)
+    temp_base = np.choose(lake_type, [np.asarray(thresholds['temp'][name][0], dtype=float) for name in LAKE_TYPES])
+    temp_high = np.choose(lake_type, [np.asarray(thresholds['temp'][name][1], dtype=float) for name in LAKE_TYPES])
+    humidity_base, humidity_high = thresholds['humidity']
+    wind_base, wind_high = thresholds['wind']
+    soil_base, soil_high = thresholds['soil_temp']
+    low_cut, high_cut = thresholds['cuts']
+
+    # Les comparaisons avec NaN sont fausses : une valeur manquante ne compte pas
+    temp_ok = temp >= temp_base
+    humidity_ok = humidity > humidity_base
+    wind_ok = wind < wind_base
+    soil_ok = soil_temp > soil_base
+
+    risk_score = (temp_ok.astype(float) + humidity_ok + wind_ok + soil_ok
+                  + weather_score * 0.5)  # 0.5 point par niveau de variation météo
+    high_risk = ((temp_ok & (temp >= temp_high)).astype(int)
+                 + (humidity_ok & (humidity > humidity_high))
+                 + (wind_ok & (wind < wind_high))
+                 + (soil_ok & (soil_temp > soil_high))
+                 + (weather_score >= 2))
+
+    return np.where(risk_score <= low_cut, 0,
+                    np.where((risk_score <= high_cut) | (high_risk == 0), 1, 2))
+
+def evaluate_conditions(conditions, lake_type, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Version par dictionnaire de score_risk : retourne (drapeau, message, conditions affichées)
+    """
+    code = score_risk(
+        conditions['temp'],
+        conditions['humidity'],
+        conditions['wind'],
+        conditions.get('soil_temp') or None,
+        conditions.get('weather_score'),
+        LAKE_TYPES.index(lake_type),
+        thresholds
+    )
+    flag = str(FLAGS[code])
+    return (flag, *describe(flag, conditions))
+
+def describe(flag, conditions):
+    """
+    Retourne le message d'un drapeau et les conditions à afficher
+    """
+    # Messages personnalisés selon les conditions
+    weather_message = ""
+    if 'weather_description' in conditions and conditions['weather_description'] != "conditions stables":
+        weather_message = f" - Instabilité météo : {conditions['weather_description']}"
+
+    # Just get  weather_description, weather_score, wind, temp, humidity, precip
+    conditions = {k: v for k, v in conditions.items() if k in ['weather_description', 'wind', 'temp', 'humidity', 'precip']}
+    return f"{MESSAGES[flag]}{weather_message}", conditions
@@ -0,0 +1,55 @@
+import numpy as np
+
+# Statistiques glissantes sur une série horaire : chaque fenêtre [lower, upper) est évaluée en O(1)
+# à partir de sommes cumulées calculées une seule fois sur toute la série
+
+def window_bounds(times, dates, window_days=7):
+    """
+    Indices [lower, upper) des heures de chaque fenêtre [date - window_days, date] (jours inclus)
+    times : horodatages horaires triés (chaînes ISO ou datetime64), dates : dates YYYY-MM-DD ou datetime64
+    """
+    times = np.asarray(times).astype('datetime64[m]')
+    days = np.asarray(dates).astype('datetime64[D]')
+    lower = np.searchsorted(times, (days - window_days).astype('datetime64[m]'), side='left')
+    upper = np.searchsorted(times, (days + 1).astype('datetime64[m]'), side='left')
+    return lower, upper
+
+def prefix_sum(values):
+    """
+    Sommes cumulées précédées de 0 : la somme de [lower, upper) vaut prefix[upper] - prefix[lower]
+    """
+    prefix = np.zeros(len(values) + 1, dtype=np.result_type(values, float))
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+def rolling_count(mask, lower, upper):
+    """
+    Nombre de valeurs vraies de chaque fenêtre
+    """
+    prefix = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.cumsum(mask, out=prefix[1:])
+    return prefix[upper] - prefix[lower]
+
+def rolling_any(mask, lower, upper):
+    return rolling_count(mask, lower, upper) > 0
+
+def rolling_sum(values, lower, upper):
+    """
+    Somme de chaque fenêtre en ignorant les NaN
+    """
+    prefix = prefix_sum(np.where(np.isnan(values), 0, values))
+    return prefix[upper] - prefix[lower]
+
+def rolling_mean(values, lower, upper):
+    """
+    Moyenne de chaque fenêtre en ignorant les NaN (NaN si la fenêtre est vide)
+    """
+    count = rolling_count(~np.isnan(values), lower, upper)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, rolling_sum(values, lower, upper) / count, np.nan)
+
+def pair_bounds(lower, upper):
+    """
+    Fenêtres sur les différences consécutives (np.diff) d'une série découpée en [lower, upper)
+    """
+    return lower, np.maximum(upper - 1, lower)
@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+# Résolution de la grille Open-Meteo utilisée pour regrouper les coordonnées (en degrés)
+GRID_RESOLUTION = 0.1
+
+# Les prévisions sont rafraîchies plusieurs fois par jour par Open-Meteo
+FORECAST_TTL = 3 * 3600
+# Les prévisions expirées restent disponibles (allow_stale) tant qu'Open-Meteo est indisponible
+MAX_STALE_AGE = 24 * 3600
+MAX_FORECAST_ENTRIES = 5000
+# last_access (ordre d'éviction LRU des prévisions) n'est réécrit qu'au plus une fois par minute par entrée
+LAST_ACCESS_RESOLUTION = 60
+
+def snap_to_grid(latitude, longitude, resolution=GRID_RESOLUTION):
+    """
+    Ramène des coordonnées au centre de la maille de la grille la plus proche
+    """
+    return (
+        round(round(latitude / resolution) * resolution, 4),
+        round(round(longitude / resolution) * resolution, 4)
+    )
+
+class WeatherCache:
+    """
+    Cache SQLite des données météo horaires, une entrée par (maille, date, variables, source)
+    Les archives n'expirent jamais, les prévisions ont un TTL et une éviction LRU
+    """
+    def __init__(self, db_file="data/weather_cache.sqlite", forecast_ttl=FORECAST_TTL,
+                 max_forecast_entries=MAX_FORECAST_ENTRIES, max_stale_age=MAX_STALE_AGE):
+        self.db_file = db_file
+        self.forecast_ttl = forecast_ttl
+        self.max_stale_age = max(max_stale_age, forecast_ttl)
+        self.max_forecast_entries = max_forecast_entries
+        self._ensure_db()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=10)
+
+    def _ensure_db(self):
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather (
+                    source TEXT NOT NULL,
+                    latitude REAL NOT NULL,
+                    longitude REAL NOT NULL,
+                    date TEXT NOT NULL,
+                    variables TEXT NOT NULL,
+                    hourly TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (source, latitude, longitude, date, variables)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_weather_lru ON weather (source, last_access)")
+
+    def _is_fresh(self, source, fetched_at, now):
+        return source == "archive" or now - fetched_at < self.forecast_ttl
+
+    def get_days(self, source, latitude, longitude, dates, variables, allow_stale=False):
+        """
+        Retourne {date: {'hourly': ...}} pour les dates présentes et encore valides
+        allow_stale : inclut aussi les prévisions expirées de moins de max_stale_age
+        """
+        key = ",".join(sorted(variables))
+        now = time.time()
+        placeholders = ",".join("?" * len(dates))
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(
+                f"""SELECT date, hourly, fetched_at, last_access FROM weather
+                    WHERE source = ? AND latitude = ? AND longitude = ? AND variables = ?
+                    AND date IN ({placeholders})""",
+                (source, latitude, longitude, key, *dates)
+            ).fetchall()
+            rows = [row for row in rows if self._is_fresh(source, row[2], now)
+                    or (allow_stale and now - row[2] < self.max_stale_age)]
+            days = {date: {'hourly': json.loads(hourly)} for date, hourly, _, _ in rows}
+
+            # Les archives ne sont jamais évincées ; pour les prévisions, une lecture n'écrit (verrou
+            # d'écriture partagé par les workers) que si last_access date de plus de LAST_ACCESS_RESOLUTION
+            touched = [row[0] for row in rows if now - row[3] >= LAST_ACCESS_RESOLUTION]
+            if source != "archive" and touched:
+                conn.execute(
+                    f"""UPDATE weather SET last_access = ?
+                        WHERE source = ? AND latitude = ? AND longitude = ? AND variables = ?
+                        AND date IN ({",".join("?" * len(touched))})""",
+                    (now, source, latitude, longitude, key, *touched)
+                )
+        return days
+
+    def fetched_at(self, source, cells, dates, variables):
+        """
+        Date de récupération (timestamp) de la plus ancienne des dates demandées pour les mailles
+        (latitude, longitude) données, None si l'une d'elles est absente du cache
+        """
+        key = ",".join(sorted(variables))
+        with closing(self._connect()) as conn:
+            count, oldest = conn.execute(
+                f"""SELECT COUNT(*), MIN(fetched_at) FROM weather
+                    WHERE source = ? AND variables = ?
+                    AND (latitude, longitude) IN (VALUES {",".join(["(?, ?)"] * len(cells))})
+                    AND date IN ({",".join("?" * len(dates))})""",
+                (source, key, *(value for cell in cells for value in cell), *dates)
+            ).fetchone()
+        return oldest if count == len(cells) * len(dates) else None
+
+    def put_days(self, source, latitude, longitude, daily_data, variables):
+        """
+        Enregistre les données horaires {date: {'hourly': ...}} d'une maille
+        Les jours d'archive incomplets (valeurs manquantes) ne sont pas conservés
+        """
+        self.put_cells(source, {(latitude, longitude): daily_data}, variables)
+
+    def put_cells(self, source, daily_by_cell, variables):
+        """
+        put_days pour plusieurs mailles {(latitude, longitude): {date: ...}} en une seule transaction
+        """
+        key = ",".join(sorted(variables))
+        now = time.time()
+        rows = []
+        for (latitude, longitude), daily_data in daily_by_cell.items():
+            for date, data in daily_data.items():
+                hourly = data['hourly']
+                if source == "archive" and any(value is None for values in hourly.values() for value in values):
+                    continue
+                rows.append((source, latitude, longitude, date, key, json.dumps(hourly), now, now))
+
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO weather VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            if source != "archive":
+                self._evict_forecasts(conn, now)
+
+    def _evict_forecasts(self, conn, now):
+        conn.execute(
+            "DELETE FROM weather WHERE source != 'archive' AND fetched_at < ?",
+            (now - self.max_stale_age,)
+        )
+        conn.execute(
+            """DELETE FROM weather WHERE rowid IN (
+                   SELECT rowid FROM weather WHERE source != 'archive'
+                   ORDER BY last_access DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.max_forecast_entries,)
+        )
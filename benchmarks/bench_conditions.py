@@ -0,0 +1,110 @@
+"""
+Micro-benchmark de get_conditions : ancienne version pandas vs version NumPy actuelle
+
+Utilisation (depuis la racine du dépôt) :
+    python benchmarks/bench_conditions.py
+"""
+import math
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)  # l'application travaille relativement au dossier app/
+
+import predictor
+
+def legacy_analyze_weather_variations(weather_data):
+    """
+    Version pandas d'origine de analyze_weather_variations (référence)
+    """
+    df = pd.DataFrame({
+        'temperature': weather_data['hourly']['temperature_2m'],
+        'humidity': weather_data['hourly']['relative_humidity_2m'],
+        'precipitation': weather_data['hourly']['precipitation'],
+        'wind_speed': weather_data['hourly']['wind_speed_10m']
+    })
+    variations = {
+        'temp_variation': df['temperature'].std(),
+        'humidity_variation': df['humidity'].std(),
+        'wind_variation': df['wind_speed'].std(),
+        'rain_episodes': len(df[df['precipitation'] > 0.5])
+    }
+    weather_changes = []
+    if (df['temperature'].diff().abs() > 5).any():
+        weather_changes.append("variations importantes de température")
+    if (df['precipitation'] > 0.5).astype(int).diff().abs().sum() > 4:
+        weather_changes.append("alternances pluie/sec")
+    if (df['humidity'].diff().abs() > 20).any():
+        weather_changes.append("variations importantes d'humidité")
+    if (df['wind_speed'].diff().abs() > 10).any():
+        weather_changes.append("variations importantes de vent")
+    variations['weather_score'] = min(len(weather_changes), 3)
+    variations['weather_changes'] = len(weather_changes)
+    variations['weather_description'] = ", ".join(weather_changes) if weather_changes else "conditions stables"
+    return variations
+
+def legacy_get_conditions(weather_data):
+    """
+    Version pandas d'origine de get_conditions (référence)
+    """
+    df = pd.DataFrame({
+        'temperature': weather_data['hourly']['temperature_2m'],
+        'humidity': weather_data['hourly']['relative_humidity_2m'],
+        'precipitation': weather_data['hourly']['precipitation'],
+        'wind_speed': weather_data['hourly']['wind_speed_10m'],
+        'soil_temp': weather_data['hourly']['soil_temperature_0_to_7cm'],
+        'soil_moisture': weather_data['hourly']['soil_moisture_0_to_7cm']
+    })
+    variations = legacy_analyze_weather_variations(weather_data)
+    return {
+        'temp': round(df['temperature'].mean(), 1),
+        'humidity': round(df['humidity'].mean(), 1),
+        'wind': round(df['wind_speed'].mean(), 1),
+        'soil_temp': round(df['soil_temp'].mean(), 1),
+        'precip': round(df['precipitation'].sum(), 1),
+        'soil_moisture': round(df['soil_moisture'].mean(), 1),
+        'weather_score': variations['weather_score'],
+        'weather_changes': variations['weather_changes'],
+        'weather_description': variations['weather_description']
+    }
+
+def synthetic_weather(hours, seed=0):
+    """
+    Réponse Open-Meteo horaire synthétique de `hours` heures
+    """
+    rnd = random.Random(seed)
+    start = datetime(2024, 7, 1)
+    bases = {
+        'temperature_2m': (22, 6),
+        'relative_humidity_2m': (70, 15),
+        'precipitation': (0.3, 0.8),
+        'wind_speed_10m': (9, 5),
+        'soil_temperature_0_to_7cm': (23, 3),
+        'soil_moisture_0_to_7cm': (0.3, 0.05)
+    }
+    hourly = {'time': [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(hours)]}
+    for variable, (base, amplitude) in bases.items():
+        hourly[variable] = [
+            round(base + amplitude * math.sin(h / 24 * 2 * math.pi) + rnd.uniform(-amplitude, amplitude) / 2, 2)
+            for h in range(hours)
+        ]
+    return {'hourly': hourly}
+
+def per_call_us(fn, weather_data, number):
+    return min(timeit.repeat(lambda: fn(weather_data), number=number, repeat=5)) / number * 1e6
+
+if __name__ == "__main__":
+    print(f"{'heures':>8} {'pandas (µs)':>12} {'numpy (µs)':>12} {'gain':>6}")
+    for hours in (24, 192):
+        weather_data = synthetic_weather(hours)
+        assert legacy_get_conditions(weather_data) == predictor.get_conditions(weather_data)
+
+        before = per_call_us(legacy_get_conditions, weather_data, 200)
+        after = per_call_us(predictor.get_conditions, weather_data, 2000)
+        print(f"{hours:>8} {before:>12.1f} {after:>12.1f} {before / after:>5.1f}x")
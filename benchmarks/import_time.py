@@ -0,0 +1,103 @@
+"""
+Rapport des temps d'import au démarrage de l'application (python -X importtime)
+
+Utilisation (depuis la racine du dépôt) :
+    python benchmarks/import_time.py                  # import de app.py, imports différés
+    python benchmarks/import_time.py --preload        # CYANO_PRELOAD=1 : tout est importé au démarrage
+    python benchmarks/import_time.py --module predictor --top 20
+    python benchmarks/import_time.py --prewarm --wait 2           # pré-calcul actif, un lac enregistré
+    python benchmarks/import_time.py --prewarm --prewarm-delay 0  # premier passage immédiat
+
+Chaque mesure est faite dans un nouvel interpréteur : les temps sont ceux d'un worker qui démarre.
+Avec --prewarm, les modules lourds sont aussi relevés --wait secondes après l'import : le thread de
+pré-calcul les importe à son premier passage (CYANO_PREWARM_DELAY secondes après le démarrage).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+# Modules dont le chargement est évité tant qu'aucune prédiction n'est faite
+HEAVY_MODULES = ["numpy", "pandas", "requests"]
+
+CHILD = """
+import json, sys, time
+{setup}
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+modules = sorted(sys.modules)
+time.sleep({wait})
+print(json.dumps({{'import_ms': elapsed * 1000, 'modules': modules, 'modules_after_wait': sorted(sys.modules)}}))
+"""
+
+# Un lac enregistré avant l'import : sans lac, le pré-calcul n'a aucune maille à rafraîchir
+SEED_LAKE = "import data; data.create_data_manager().add_lake('bench', 'bench', 37.3, -83.5, 'forest')"
+
+def parse_importtime(stderr):
+    """
+    Lignes "import time: self | cumulative | module" de -X importtime
+    Retourne (module, profondeur, self_ms, cumulative_ms), dans l'ordre de fin d'import
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), depth, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return entries
+
+def import_report(module="app", preload=False, top=15, cwd=None, prewarm=False, wait=0, prewarm_delay=None):
+    """
+    Temps d'import de module dans un nouvel interpréteur, modules lourds chargés et
+    imports les plus coûteux (temps cumulé, modules importés directement par le processus)
+    prewarm : pré-calcul actif (configuration par défaut de l'application) avec un lac enregistré ;
+    les modules lourds sont relevés à nouveau wait secondes après l'import
+    """
+    env = dict(os.environ, PYTHONPATH=APP_DIR, CYANO_PREWARM="1" if prewarm else "0",
+               CYANO_PRELOAD="1" if preload else "0")
+    if prewarm:
+        # Pas d'appel réseau depuis le thread de pré-calcul : port local fermé
+        env["OPEN_METEO_FORECAST_URL"] = "http://127.0.0.1:9/v1/forecast"
+    if prewarm_delay is not None:
+        env["CYANO_PREWARM_DELAY"] = str(prewarm_delay)
+    child_code = CHILD.format(module=module, setup=SEED_LAKE if prewarm else "", wait=wait)
+    with tempfile.TemporaryDirectory(prefix="cyano-import-") as workdir:
+        # app.py crée ses fichiers de données (data/) dans le répertoire courant
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", child_code],
+                                   cwd=cwd or workdir, env=env, capture_output=True, text=True, check=True)
+    child = json.loads(completed.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(completed.stderr)
+    # Imports directs du module : lignes de profondeur 1 qui précèdent sa propre ligne
+    end = max(i for i, entry in enumerate(entries) if entry[0] == module and entry[1] == 0)
+    start = max([i for i, entry in enumerate(entries[:end]) if entry[1] == 0], default=-1) + 1
+    roots = sorted((entry for entry in entries[start:end] if entry[1] == 1), key=lambda entry: -entry[3])
+    return {
+        'module': module,
+        'preload': preload,
+        'prewarm': prewarm,
+        'import_ms': round(child['import_ms'], 3),
+        'modules': len(child['modules']),
+        'heavy': {name: name in child['modules'] for name in HEAVY_MODULES},
+        **({f'heavy_after_{wait}s': {name: name in child['modules_after_wait'] for name in HEAVY_MODULES}}
+           if wait else {}),
+        'top': [{'module': name, 'cumulative_ms': round(cumulative, 3), 'self_ms': round(self_ms, 3)}
+                for name, _, self_ms, cumulative in roots[:top]]
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Temps d'import au démarrage")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--preload", action="store_true", help="CYANO_PRELOAD=1")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--prewarm", action="store_true", help="CYANO_PREWARM=1 avec un lac enregistré")
+    parser.add_argument("--prewarm-delay", type=int, help="CYANO_PREWARM_DELAY (défaut : celui de l'application)")
+    parser.add_argument("--wait", type=float, default=0, help="secondes d'attente avant le second relevé")
+    args = parser.parse_args()
+    print(json.dumps(import_report(args.module, args.preload, args.top, prewarm=args.prewarm, wait=args.wait,
+                                   prewarm_delay=args.prewarm_delay), indent=2))
@@ -0,0 +1,248 @@
+"""
+Suite de benchmarks sans réseau : Open-Meteo est remplacé par le serveur local de stub_server.py
+
+Utilisation (depuis la racine du dépôt) :
+    python benchmarks/run.py --output bench.json
+    python benchmarks/run.py --compare bench.json        # rapport de la version précédente
+
+Mesures :
+    démarrage               import de app.py (imports différés ou CYANO_PRELOAD=1)
+    predict_for_date        froid (appel au serveur local) et à chaud (cache SQLite)
+    /predict                de bout en bout avec le client de test Flask
+    DataManager             JSON et SQLite avec 10 000 utilisateurs / 100 000 lacs
+    présence cyanobactéries analyze_cyano_presence et cyano_presence_all sur le classeur complet
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+ANALYSE_DIR = os.path.join(ROOT_DIR, 'analyse')
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, ANALYSE_DIR)
+
+from import_time import import_report
+from stub_server import StubServer
+
+TAXA_FILE = os.path.join(ANALYSE_DIR, 'data2', 'cyanotoxin-taxa-data-xlsx-3.xls')
+USERS = 10_000
+LAKES = 100_000
+
+def summarize(durations):
+    """
+    Statistiques d'une liste de durées en millisecondes
+    """
+    durations = sorted(durations)
+    return {
+        'n': len(durations),
+        'mean_ms': round(statistics.fmean(durations), 4),
+        'median_ms': round(statistics.median(durations), 4),
+        'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 4),
+        'min_ms': round(durations[0], 4),
+        'max_ms': round(durations[-1], 4)
+    }
+
+def measure(fn, repeat=20, warmup=1):
+    """
+    Durées de repeat appels de fn(i) en millisecondes (après warmup appels non mesurés)
+    """
+    for i in range(warmup):
+        fn(-1 - i)
+    durations = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        fn(i)
+        durations.append((time.perf_counter() - started) * 1000)
+    return summarize(durations)
+
+def bench_startup(results):
+    # Import de app.py dans un nouvel interpréteur, avec et sans imports différés
+    for mode, preload in [('lazy', False), ('preload', True)]:
+        results[f'startup.import_app.{mode}'] = summarize(
+            [import_report('app', preload, cwd=os.getcwd())['import_ms'] for _ in range(5)])
+
+def bench_predictor(results):
+    import predictor
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    past = "2023-07-15"
+
+    # Coordonnées différentes à chaque appel : toujours absentes du cache
+    cold = lambda date: lambda i: predictor.predict_for_date(40 + (i % 100) * 0.1, -80 - (i // 100) * 0.1 - 1, date, "forest")
+    results['predict_for_date.forecast.cold'] = measure(cold(today), repeat=50)
+    results['predict_for_date.archive.cold'] = measure(cold(past), repeat=50)
+    results['predict_for_date.forecast.warm'] = measure(lambda i: predictor.predict_for_date(37.3, -83.5, today, "forest"), repeat=200)
+    results['predict_for_date.archive.warm'] = measure(lambda i: predictor.predict_for_date(37.3, -83.5, past, "forest"), repeat=200)
+    results['predict_range.7d.warm'] = measure(lambda i: predictor.predict_range(37.3, -83.5, today, 7, "forest"), repeat=200)
+
+def bench_flask(results):
+    os.environ["CYANO_PREWARM"] = "0"
+    import app as webapp
+
+    client = webapp.app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'bench'
+
+    def predict(latitude):
+        response = client.post('/predict', data={'latitude': latitude, 'longitude': -83.5, 'lakeType': 'forest'})
+        assert response.status_code == 200, response.data
+
+    results['flask./predict.cold'] = measure(lambda i: predict(30 + i * 0.1), repeat=50)
+    results['flask./predict.warm'] = measure(lambda i: predict(37.3), repeat=200)
+
+    # GET servi par le cache de réponses, puis revalidation conditionnelle (304)
+    url = '/predict?latitude=37.3&longitude=-83.5&lakeType=forest'
+    etag = client.get(url).headers['ETag']
+    results['flask./predict.get_cached'] = measure(lambda i: client.get(url), repeat=200)
+    results['flask./predict.not_modified'] = measure(
+        lambda i: client.get(url, headers={'If-None-Match': etag}), repeat=200)
+
+    # Carte régionale de 2 × 2 tuiles (256 mailles) : zone différente à chaque calcul à froid
+    def grid(i):
+        south = 30 + (i % 10) * 0.8
+        response = client.get(f'/grid?south={south}&west=-84&north={south + 0.8}&east=-83.2')
+        assert response.status_code == 200, response.data
+
+    results['flask./grid.cold'] = measure(grid, repeat=5)
+    results['flask./grid.warm'] = measure(lambda i: grid(0), repeat=50)
+
+def populate(users=USERS, lakes=LAKES, seed=0):
+    """
+    Utilisateurs et lacs synthétiques au format de DataManager.load_users / load_lakes
+    """
+    rnd = random.Random(seed)
+    created_at = "2024-01-01 00:00:00"
+    user_data = {f"user{i}": {"password": f"pw{i}", "created_at": created_at} for i in range(users)}
+    lake_data = {}
+    for i in range(lakes):
+        lake_data.setdefault(f"user{i % users}", []).append({
+            "name": f"lac{i}",
+            "latitude": round(rnd.uniform(36, 41), 4),
+            "longitude": round(rnd.uniform(-89, -82), 4),
+            "type": rnd.choice(["forest", "agriculture", "urban"]),
+            "created_at": created_at
+        })
+    return user_data, lake_data
+
+def bench_datamanager(results):
+    from data import DataManager, SQLiteDataManager
+
+    user_data, lake_data = populate()
+    managers = {'json': DataManager(), 'sqlite': SQLiteDataManager("data/bench.sqlite")}
+    for backend, manager in managers.items():
+        started = time.perf_counter()
+        manager.save_users(user_data)
+        manager.save_lakes(lake_data)
+        results[f'datamanager.{backend}.populate'] = {'n': 1, 'mean_ms': round((time.perf_counter() - started) * 1000, 4)}
+
+        rnd = random.Random(1)
+        prefix = f'datamanager.{backend}'
+        results[f'{prefix}.verify_user'] = measure(
+            lambda i: manager.verify_user(f"user{rnd.randrange(USERS)}", "pw"), repeat=200)
+        results[f'{prefix}.get_user_lakes'] = measure(
+            lambda i: manager.get_user_lakes(f"user{rnd.randrange(USERS)}"), repeat=200)
+        results[f'{prefix}.get_all_lakes'] = measure(lambda i: manager.get_all_lakes(), repeat=5)
+        # Les écritures JSON réécrivent tout le fichier : peu de répétitions
+        writes = 5 if backend == 'json' else 200
+        results[f'{prefix}.register_user'] = measure(
+            lambda i: manager.register_user(f"new{backend}{i}", "pw"), repeat=writes)
+        results[f'{prefix}.add_lake'] = measure(
+            lambda i: manager.add_lake(f"user{i}", f"nouveau{i}", 38.0, -84.0, "forest"), repeat=writes)
+
+def bench_presence(results):
+    from datasets import read_sheet
+    from fusion import analyze_cyano_presence
+    from presence import cyano_presence_all
+
+    if not os.path.exists(TAXA_FILE):
+        return
+    read_sheet(TAXA_FILE, 'All_data')  # conversion Parquet hors mesure
+    results['presence.read_sheet'] = measure(lambda i: read_sheet(TAXA_FILE, 'All_data'), repeat=10)
+    taxa = read_sheet(TAXA_FILE, 'All_data')
+    results['presence.cyano_presence_all'] = measure(lambda i: cyano_presence_all(taxa), repeat=20)
+    results['presence.analyze_cyano_presence'] = measure(lambda i: analyze_cyano_presence(TAXA_FILE, "BHR"), repeat=10)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current, previous):
+    """
+    Rapport texte : médiane actuelle, précédente et rapport pour chaque mesure commune
+    """
+    lines = [f"{'mesure':<42} {'avant (ms)':>11} {'après (ms)':>11} {'rapport':>8}"]
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if before is None:
+            continue
+        key = 'median_ms' if 'median_ms' in result and 'median_ms' in before else 'mean_ms'
+        ratio = result[key] / before[key] if before[key] else float('nan')
+        lines.append(f"{name:<42} {before[key]:>11.3f} {result[key]:>11.3f} {ratio:>7.2f}x")
+    return "\n".join(lines)
+
+def run(only=None):
+    benchmarks = {
+        'startup': bench_startup,
+        'predictor': bench_predictor,
+        'flask': bench_flask,
+        'datamanager': bench_datamanager,
+        'presence': bench_presence
+    }
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="cyano-bench-")
+    cwd = os.getcwd()
+    with StubServer() as server:
+        # Les URL sont lues à l'import de predictor
+        os.environ["OPEN_METEO_FORECAST_URL"] = server.url("forecast")
+        os.environ["OPEN_METEO_ARCHIVE_URL"] = server.url("archive")
+        # Le limiteur de débit d'Open-Meteo ne doit pas compter dans les mesures du serveur local
+        import http_client
+        http_client.RATE_PER_SECOND = http_client.BURST = 1_000_000
+        # Caches et fichiers de données (chemins relatifs data/) dans un dossier temporaire
+        os.chdir(workdir)
+        try:
+            for name, bench in benchmarks.items():
+                if only is None or name in only:
+                    bench(results)
+        finally:
+            os.chdir(cwd)
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'workdir': workdir
+        },
+        'results': results
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de l'application sans accès réseau")
+    parser.add_argument("--only", nargs="*", choices=['startup', 'predictor', 'flask', 'datamanager', 'presence'])
+    parser.add_argument("--output", help="fichier JSON de résultats (défaut : sortie standard)")
+    parser.add_argument("--compare", help="résultats JSON d'un lancement précédent")
+    args = parser.parse_args()
+
+    report = run(args.only)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
@@ -0,0 +1,174 @@
+"""
+Serveur HTTP local remplaçant Open-Meteo pour les benchmarks (aucun accès réseau)
+
+Les réponses rejouent les fixtures enregistrées de benchmarks/fixtures/<source>.json : les séries
+horaires enregistrées sont recalées sur la période demandée. Sans fixture, une série synthétique
+déterministe est utilisée.
+
+Enregistrement des fixtures depuis la vraie API (une fois, avec accès réseau) :
+    python benchmarks/stub_server.py --record
+"""
+import argparse
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+OPEN_METEO_URLS = {
+    "forecast": "https://api.open-meteo.com/v1/forecast",
+    "archive": "https://archive-api.open-meteo.com/v1/archive"
+}
+HOURLY_VARIABLES = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "wind_speed_10m",
+    "soil_temperature_0_to_7cm",
+    "soil_moisture_0_to_7cm"
+]
+# Point et période enregistrés (réservoir BHR)
+RECORD_LOCATION = (37.3, -83.5)
+RECORD_ARCHIVE_DATES = ("2023-07-01", "2023-07-31")
+
+def fixture_path(source):
+    return os.path.join(FIXTURES_DIR, f"{source}.json")
+
+def synthetic_fixture(hours=24 * 31):
+    """
+    Série horaire déterministe (cycle journalier) au format Open-Meteo
+    """
+    shapes = {
+        'temperature_2m': (22, 6, 1),
+        'relative_humidity_2m': (70, 15, 0),
+        'precipitation': (0.3, 0.8, 2),
+        'wind_speed_10m': (9, 5, 3),
+        'soil_temperature_0_to_7cm': (23, 3, 1),
+        'soil_moisture_0_to_7cm': (0.3, 0.05, 0)
+    }
+    start = datetime(2023, 7, 1)
+    hourly = {'time': [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(hours)]}
+    for variable, (base, amplitude, phase) in shapes.items():
+        hourly[variable] = [
+            round(base + amplitude * math.sin((h + phase) / 24 * 2 * math.pi) + amplitude * math.sin(h * 0.37) / 3, 2)
+            for h in range(hours)
+        ]
+    return {'latitude': RECORD_LOCATION[0], 'longitude': RECORD_LOCATION[1], 'hourly': hourly}
+
+def load_fixture(source):
+    path = fixture_path(source)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return synthetic_fixture()
+
+def replay(fixture, latitude, longitude, start_date, end_date, variables):
+    """
+    Réponse pour la période demandée : les heures enregistrées sont reprises dans l'ordre, en boucle
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    hours = ((datetime.strptime(end_date, "%Y-%m-%d") - start).days + 1) * 24
+    recorded = fixture['hourly']
+    size = len(recorded['time'])
+    hourly = {'time': [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(hours)]}
+    for variable in variables:
+        hourly[variable] = [recorded[variable][h % size] for h in range(hours)]
+    return {'latitude': latitude, 'longitude': longitude, 'hourly': hourly}
+
+class StubHandler(BaseHTTPRequestHandler):
+    fixtures = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        source = url.path.rstrip('/').split('/')[-1]
+        params = parse_qs(url.query)
+        if source not in self.fixtures:
+            return self._send(404, {'error': True, 'reason': f"source inconnue : {source}"})
+
+        variables = [name for value in params.get('hourly', []) for name in value.split(',')]
+        try:
+            # Plusieurs points séparés par des virgules : une réponse par point, dans une liste
+            locations = list(zip(params['latitude'][0].split(','), params['longitude'][0].split(','), strict=True))
+            body = [
+                replay(self.fixtures[source], float(latitude), float(longitude),
+                       params['start_date'][0], params['end_date'][0], variables)
+                for latitude, longitude in locations
+            ]
+            body = body[0] if len(body) == 1 else body
+        except (KeyError, ValueError) as e:
+            return self._send(400, {'error': True, 'reason': f"paramètre invalide : {e}"})
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer:
+    """
+    Serveur sur un port libre de 127.0.0.1, lancé dans un thread :
+        with StubServer() as server:
+            server.url("forecast")
+    """
+    def __init__(self):
+        StubHandler.fixtures = {source: load_fixture(source) for source in OPEN_METEO_URLS}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, source):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/v1/{source}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def record():
+    """
+    Enregistre une réponse réelle de chaque point d'accès dans benchmarks/fixtures/
+    """
+    today = datetime.now()
+    periods = {
+        "forecast": (today.strftime("%Y-%m-%d"), (today + timedelta(days=6)).strftime("%Y-%m-%d")),
+        "archive": RECORD_ARCHIVE_DATES
+    }
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for source, (start_date, end_date) in periods.items():
+        response = requests.get(OPEN_METEO_URLS[source], params={
+            "latitude": RECORD_LOCATION[0],
+            "longitude": RECORD_LOCATION[1],
+            "start_date": start_date,
+            "end_date": end_date,
+            "hourly": HOURLY_VARIABLES
+        }, timeout=30)
+        response.raise_for_status()
+        with open(fixture_path(source), 'w') as f:
+            json.dump(response.json(), f)
+        print(f"{fixture_path(source)} : {start_date} -> {end_date}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur local Open-Meteo pour les benchmarks")
+    parser.add_argument("--record", action="store_true", help="enregistre les fixtures depuis la vraie API")
+    args = parser.parse_args()
+    if args.record:
+        record()
+    else:
+        with StubServer() as server:
+            print(f"forecast : {server.url('forecast')}\narchive : {server.url('archive')}")
+            server.thread.join()